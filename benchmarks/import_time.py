@@ -0,0 +1,70 @@
+"""Import time budget of jenkins_siddhu.py.
+
+Runs `jenkins_siddhu.py --help` in a fresh interpreter a number of times and fails (exit status 1) when the median
+wall time goes over the budget, or when one of the heavy modules that only some commands need got imported anyway.
+
+    python benchmarks/import_time.py [--runs 15] [--budget-ms 80]
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+## Median milliseconds `jenkins_siddhu.py --help` may take, interpreter start up included.
+BUDGET_MS = 80
+## Modules that must not be imported just to print the help.
+LAZY_MODULES = ['yaml', 'prettytable', 'httplib2', 'jenkinssai']
+
+CHECK = """
+import sys
+sys.argv = ['jenkins_siddhu.py', '--help']
+import jenkins_siddhu
+try:
+    jenkins_siddhu.basecli(obj={})
+except SystemExit:
+    pass
+sys.stderr.write(' '.join(m for m in %r if m in sys.modules))
+""" % (LAZY_MODULES,)
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks the start up time of jenkins_siddhu.py against a budget")
+    parser.add_argument('--runs', type=int, default=15)
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS)
+    args = parser.parse_args()
+
+    devnull = open(os.devnull, 'w')
+    timings = list()
+    for _ in range(args.runs):
+        started = time.time()
+        subprocess.check_call([sys.executable, os.path.join(ROOT, 'jenkins_siddhu.py'), '--help'], stdout=devnull)
+        timings.append((time.time() - started) * 1000)
+
+    baseline = list()
+    for _ in range(args.runs):
+        started = time.time()
+        subprocess.check_call([sys.executable, '-c', 'pass'])
+        baseline.append((time.time() - started) * 1000)
+
+    check = subprocess.Popen([sys.executable, '-c', CHECK], cwd=ROOT, stdout=devnull, stderr=subprocess.PIPE)
+    imported = check.communicate()[1].split()
+
+    print "jenkins_siddhu.py --help: median {0:.1f} ms, interpreter alone {1:.1f} ms, budget {2:.0f} ms".format(median(timings), median(baseline), args.budget_ms)
+
+    failed = False
+    if imported:
+        print "FAIL: --help imported {0}".format(", ".join(imported))
+        failed = True
+    if median(timings) > args.budget_ms:
+        print "FAIL: over budget by {0:.1f} ms".format(median(timings) - args.budget_ms)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""Throughput benchmarks of jenkins_siddhu.py against synthetic jenkins servers (see stub_jenkins.py).
+
+Every scenario runs the real CLI in a fresh interpreter, `--runs` times, against stubs that are reset before each run,
+and reports
+
+    jobs/s      jobs (or hosts, for plugins-compare) handled per second of the median run
+    p50, p95    wall time of a run, interpreter start up included
+    req p50/p95 time on the wire of a single request, from the --metrics-file of the runs
+    peak RSS    largest resident set of the CLI process over the runs
+    req/job     requests the stubs served per job, which catches a change that adds round trips
+
+    python benchmarks/run.py --jobs 500 --latency 0.005 --runs 5
+    python benchmarks/run.py --json-out before.json
+    python benchmarks/run.py --baseline before.json     # exits 1 if a scenario got slower or bigger
+
+The stubs listen on 127.0.0.1, 127.0.0.2, ... so that plugins compare sees them as different hosts. They run in
+processes of their own: a CLI forked from a process holding them would count their memory in its peak RSS.
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import urllib2
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(ROOT, 'jenkins_siddhu.py')
+STUB = os.path.join(ROOT, 'benchmarks', 'stub_jenkins.py')
+
+SCENARIOS = ['jobs-list', 'jobs-status', 'disable-all', 'migrate', 'release-copy', 'plugins-compare']
+
+class stub_process(object):
+    """A stub_jenkins.py running in a process of its own, driven through its __stub__ endpoints."""
+
+    def __init__(self, host, jobs, payload_bytes, latency, error_rate, plugins, capacity=None):
+        self.jobs_count = jobs
+        arguments = [sys.executable, STUB, '--host', host, '--port', '0', '--jobs', str(jobs),
+                     '--payload-bytes', str(payload_bytes), '--latency', str(latency), '--error-rate', str(error_rate),
+                     '--plugins', str(plugins)]
+        if capacity is not None:
+            arguments += ['--capacity', str(capacity)]
+        self.process = subprocess.Popen(arguments, stdout=subprocess.PIPE)
+        ## the stub prints "Serving <n> jobs on <url>" once it listens
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError("stub on {0} did not start".format(host))
+        self.url = line.split()[-1]
+
+    def reset(self):
+        urllib2.urlopen(urllib2.Request(self.url + '__stub__/reset', data='')).read()
+
+    @property
+    def requests(self):
+        return json.loads(urllib2.urlopen(self.url + '__stub__/stats').read())['requests']
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+def request_percentiles(metrics_files, ps):
+    """Percentiles ps of the request duration histograms in metrics_files (written by --metrics-file), over every
+    host and endpoint together. As histogram_quantile of prometheus does, a percentile is interpolated linearly
+    within its bucket. Returns None for each p if no request was recorded."""
+    buckets = dict()
+    for path in metrics_files:
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            for line in f:
+                match = re.match(r'jenkinssai_request_duration_seconds_bucket\{.*le="([^"]+)"\} (\d+)$', line.strip())
+                if match:
+                    bound = float(match.group(1))
+                    buckets[bound] = buckets.get(bound, 0) + int(match.group(2))
+
+    bounds = sorted(buckets.keys())
+    total = buckets.get(float('inf'), 0)
+    results = list()
+    for p in ps:
+        if total == 0:
+            results.append(None)
+            continue
+        rank = p / 100.0 * total
+        lower, below = 0.0, 0
+        for bound in bounds:
+            if buckets[bound] >= rank:
+                ## the +Inf bucket has no upper end, report the largest finite bound instead
+                if bound == float('inf'):
+                    results.append(lower)
+                else:
+                    results.append(lower + (bound - lower) * (rank - below) / max(1, buckets[bound] - below))
+                break
+            lower, below = bound, buckets[bound]
+    return results
+
+def scenario_commands(name, stubs, concurrency):
+    """Returns (arguments of jenkins_siddhu.py, stdin, number of items the run handles) of a scenario."""
+    src, dest = stubs[0], stubs[1]
+    if name == 'jobs-list':
+        return ['jobs', 'list', '-J', src.url, '-s'], '', src.jobs_count
+    if name == 'jobs-status':
+        return ['jobs', 'status', '-J', src.url, '--ndjson'], '', src.jobs_count
+    if name == 'disable-all':
+        return ['jobs', 'disable-all', '-J', src.url, '-n', str(concurrency)], 'y\n', src.jobs_count
+    if name == 'migrate':
+        return ['migrate', '-s', src.url, '-d', dest.url, '-n', str(concurrency), '-D', 'src'], '', src.jobs_count
+    if name == 'release-copy':
+        return (['release-copy', '-s', src.url+'view/all/', '-d', dest.url+'view/all/',
+                 '-T', 'release-1', 'release-2', '-t', 'release-1', 'release-2', '-D', 'dest'], '', src.jobs_count)
+    if name == 'plugins-compare':
+        return ['plugins', 'compare', '-s'] + [stub.url for stub in stubs], '', len(stubs)
+    raise ValueError("Unknown scenario {0}".format(name))
+
+def run_once(arguments, stdin, config_file, scratch, metrics_file):
+    """Runs the CLI once, writing its request statistics to metrics_file. Returns (seconds, peak RSS in KiB, exit
+    status)."""
+    env = dict(os.environ,
+               JENKINSSAI_CACHE_DIR=os.path.join(scratch, 'cache'),
+               JENKINSSAI_RUNS_DIR=os.path.join(scratch, 'runs'))
+    for d in ('cache', 'runs'):
+        shutil.rmtree(os.path.join(scratch, d), ignore_errors=True)
+
+    with open(os.devnull, 'w') as devnull:
+        started = time.time()
+        p = subprocess.Popen([sys.executable, CLI, '-c', config_file, '--metrics-file', metrics_file] + arguments,
+                             stdin=subprocess.PIPE, stdout=devnull, stderr=devnull, env=env)
+        p.stdin.write(stdin)
+        p.stdin.close()
+        _, status, usage = os.wait4(p.pid, 0)
+        elapsed = time.time() - started
+    ## ru_maxrss is in KiB on linux
+    return elapsed, usage.ru_maxrss, os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+
+def run_scenario(name, stubs, args, config_file, scratch):
+    arguments, stdin, items = scenario_commands(name, stubs, args.concurrency)
+    timings, rss, requests, failures = list(), list(), list(), 0
+    metrics_files = [os.path.join(scratch, "{0}-{1}.metrics".format(name, i)) for i in range(args.runs)]
+
+    for metrics_file in metrics_files:
+        for stub in stubs:
+            stub.reset()
+        elapsed, maxrss, status = run_once(arguments, stdin, config_file, scratch, metrics_file)
+        timings.append(elapsed)
+        rss.append(maxrss)
+        requests.append(sum(sum(stub.requests.values()) for stub in stubs))
+        if status != 0:
+            failures += 1
+
+    median = percentile(timings, 50)
+    request_p50, request_p95 = request_percentiles(metrics_files, [50, 95])
+    return {'scenario': name,
+            'items': items,
+            'runs': args.runs,
+            'failed_runs': failures,
+            'items_per_second': items / median if median > 0 else 0,
+            'p50_seconds': median,
+            'p95_seconds': percentile(timings, 95),
+            'request_p50_seconds': request_p50,
+            'request_p95_seconds': request_p95,
+            'peak_rss_kib': max(rss),
+            'requests_per_item': float(percentile(requests, 50)) / max(1, items)}
+
+def milliseconds(seconds):
+    return "-" if seconds is None else "{0:.1f}".format(seconds * 1000)
+
+def compare(results, baseline, tolerance):
+    """Lines describing every scenario that regressed by more than tolerance against baseline."""
+    before = dict((r['scenario'], r) for r in baseline['results'])
+    regressions = list()
+    for r in results:
+        b = before.get(r['scenario'])
+        if b is None:
+            continue
+        if r['items_per_second'] < b['items_per_second'] * (1 - tolerance):
+            regressions.append("{0}: {1:.1f} jobs/s, was {2:.1f}".format(r['scenario'], r['items_per_second'], b['items_per_second']))
+        if r['peak_rss_kib'] > b['peak_rss_kib'] * (1 + tolerance):
+            regressions.append("{0}: peak RSS {1:.1f} MiB, was {2:.1f}".format(r['scenario'], r['peak_rss_kib'] / 1024.0, b['peak_rss_kib'] / 1024.0))
+        if r.get('request_p95_seconds') and b.get('request_p95_seconds') and r['request_p95_seconds'] > b['request_p95_seconds'] * (1 + tolerance):
+            regressions.append("{0}: request p95 {1:.1f} ms, was {2:.1f}".format(r['scenario'], r['request_p95_seconds'] * 1000, b['request_p95_seconds'] * 1000))
+        if r['requests_per_item'] > b['requests_per_item'] * (1 + tolerance):
+            regressions.append("{0}: {1:.2f} requests per job, was {2:.2f}".format(r['scenario'], r['requests_per_item'], b['requests_per_item']))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks jenkins_siddhu.py against synthetic jenkins servers")
+    parser.add_argument('scenarios', nargs='*', default=SCENARIOS, help="any of " + ", ".join(SCENARIOS))
+    parser.add_argument('--jobs', type=int, default=200, help="jobs on the source jenkins")
+    parser.add_argument('--payload-bytes', type=int, default=2048, help="size of every config.xml")
+    parser.add_argument('--latency', type=float, default=0.002, help="seconds the stubs add to every request")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests the stubs fail with a 500")
+    parser.add_argument('--plugins', type=int, default=150, help="plugins installed on every stub")
+    parser.add_argument('--capacity', type=int, default=None, help="requests a stub serves at once, more get a 429")
+    parser.add_argument('--hosts', type=int, default=3, help="number of stubs; plugins-compare uses all of them")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--json-out', help="also write the results to this file")
+    parser.add_argument('--baseline', help="results written earlier by --json-out to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="relative change that counts as a regression")
+    args = parser.parse_args()
+
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error("unknown scenario {0}".format(name))
+
+    stubs = list()
+    try:
+        for i in range(max(2, args.hosts)):
+            ## only the first stub has jobs, the others are destinations
+            stubs.append(stub_process('127.0.0.{0}'.format(i + 1), args.jobs if i == 0 else 0, args.payload_bytes,
+                                      args.latency, args.error_rate, args.plugins - i, args.capacity))
+    except Exception:
+        for stub in stubs:
+            stub.stop()
+        raise
+
+    scratch = tempfile.mkdtemp(prefix='jenkinssai-bench-')
+    config_file = os.path.join(scratch, 'config.yaml')
+    with open(config_file, 'w') as f:
+        for stub in stubs:
+            f.write("{0}:\n  user: bench\n  pass: bench\n".format(stub.url.split('//')[1].rstrip('/')))
+
+    results = list()
+    try:
+        print "{0:<16} {1:>6} {2:>9} {3:>8} {4:>8} {5:>11} {6:>11} {7:>10} {8:>8} {9:>7}".format(
+            'scenario', 'jobs', 'jobs/s', 'p50 s', 'p95 s', 'req p50 ms', 'req p95 ms', 'peak MiB', 'req/job', 'failed')
+        for name in args.scenarios:
+            r = run_scenario(name, stubs, args, config_file, scratch)
+            results.append(r)
+            print "{0:<16} {1:>6} {2:>9.1f} {3:>8.3f} {4:>8.3f} {5:>11} {6:>11} {7:>10.1f} {8:>8.2f} {9:>7}".format(
+                r['scenario'], r['items'], r['items_per_second'], r['p50_seconds'], r['p95_seconds'],
+                milliseconds(r['request_p50_seconds']), milliseconds(r['request_p95_seconds']),
+                r['peak_rss_kib'] / 1024.0, r['requests_per_item'], "{0}/{1}".format(r['failed_runs'], r['runs']))
+            sys.stdout.flush()
+    finally:
+        for stub in stubs:
+            stub.stop()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            f.write(json.dumps({'settings': vars(args), 'results': results}, indent=1, sort_keys=True))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.loads(f.read()), args.tolerance)
+        for line in regressions:
+            print "REGRESSION: " + line
+        sys.exit(1 if regressions else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""Synthetic jenkins for the benchmarks.
+
+Serves the endpoints jenkinssai uses, on a loopback address, from jobs kept in memory:
+
+    HEAD /                                  the probe of jenkinsHttpObject.session
+    GET  [view/<view>/]api/json             job listing, honouring tree=jobs[...]{from,to} paging, with lastBuild if asked
+    GET  job/<name>/config.xml              config of a job, padded to payload_bytes
+    POST job/<name>/config.xml              replaces the config of a job
+    POST [view/<view>/]createItem           creates a job from the posted config, or with mode=copy&from=<job>
+    POST job/<name>/enable|disable|doDelete
+    GET  pluginManager/api/json             installed plugins
+
+and, for a benchmark driving a stub in another process, two endpoints that are neither counted nor slowed down:
+
+    GET  __stub__/stats                     {"requests": {method: count}, "rejected": count, "jobs": count}
+    POST __stub__/reset                     reset()
+
+Every request, the HEAD probe included, can be slowed down by latency seconds and fails with a 500 with probability
+error_rate. With capacity set, a request arriving while capacity requests are already being served is turned away
+with a 429, as a jenkins behind a rate limiting proxy would; the probe is not spared that either.
+Views are not modelled: every view lists all jobs.
+
+    python benchmarks/stub_jenkins.py --port 8080 --jobs 2000 --latency 0.005
+"""
+import re
+import sys
+import time
+import random
+import argparse
+import threading
+import BaseHTTPServer
+import SocketServer
+from json import dumps
+from urlparse import urlparse, parse_qs
+
+CONFIG_XML = """<?xml version='1.0' encoding='UTF-8'?>
+<project>
+  <description>{name}, built from release-1</description>
+  <keepDependencies>false</keepDependencies>
+  <scm class="hudson.scm.NullSCM"/>
+  <disabled>false</disabled>
+  <builders>
+    <hudson.tasks.Shell>
+      <command>make release-1 # {padding}</command>
+    </hudson.tasks.Shell>
+  </builders>
+</project>
+"""
+
+def config_xml(name, payload_bytes):
+    xml = CONFIG_XML.format(name=name, padding='')
+    return CONFIG_XML.format(name=name, padding='x' * max(0, payload_bytes - len(xml)))
+
+class __threaded_server__(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class stub_jenkins(object):
+    """A synthetic jenkins running on a daemon thread. Jobs are named <prefix>00000, <prefix>00001, ...
+
+    requests counts the requests served per method and rejected those turned away for capacity, reset() restores the
+    initial jobs between benchmark runs."""
+
+    def __init__(self, host='127.0.0.1', port=0, jobs=100, payload_bytes=2048, latency=0.0, error_rate=0.0,
+                 plugins=150, prefix='app-release-1-', capacity=None):
+        self.jobs_count = jobs
+        self.capacity = capacity
+        self.inflight = 0
+        self.payload_bytes = payload_bytes
+        self.latency = latency
+        self.error_rate = error_rate
+        self.plugins_count = plugins
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.started_ms = int(time.time() * 1000)
+        self.reset()
+
+        stub = self
+        class handler(__handler__):
+            jenkins = stub
+        self.server = __threaded_server__((host, port), handler)
+        self.url = "http://{0}:{1}/".format(*self.server.server_address)
+        self.thread = None
+
+    def reset(self):
+        with self.lock:
+            self.jobs = dict()
+            for i in range(self.jobs_count):
+                name = "{0}{1:05d}".format(self.prefix, i)
+                self.jobs[name] = {'xml': config_xml(name, self.payload_bytes), 'color': 'blue'}
+            self.requests = dict()
+            self.rejected = 0
+            self.inflight = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def admit(self, method):
+        """Counts a request and returns False if it is over capacity; admitted requests must be let go with done()."""
+        with self.lock:
+            self.requests[method] = self.requests.get(method, 0) + 1
+            if self.capacity is not None and self.inflight >= self.capacity:
+                self.rejected += 1
+                return False
+            self.inflight += 1
+            return True
+
+    def done(self):
+        with self.lock:
+            self.inflight -= 1
+
+class __handler__(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    ## buffer each response and send it with a single flush; unbuffered, the status line, headers and body go out as
+    ## small writes that Nagle and delayed ACKs hold up by tens of milliseconds on a keep-alive connection
+    wbufsize = -1
+    jenkins = None
+
+    def log_message(self, *args):
+        pass
+
+    def __send__(self, code, body='', content_type='text/plain'):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+        self.wfile.flush()
+
+    def __handle__(self):
+        stub = self.jenkins
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+        if self.path.startswith('/__stub__/'):
+            return self.__control__(stub)
+        if not stub.admit(self.command):
+            return self.__send__(429, "Too many requests")
+        try:
+            self.__serve__(stub, body)
+        finally:
+            stub.done()
+
+    do_GET = do_POST = do_HEAD = __handle__
+
+    def __control__(self, stub):
+        if self.path == '/__stub__/reset' and self.command == 'POST':
+            stub.reset()
+            return self.__send__(200)
+        if self.path == '/__stub__/stats':
+            with stub.lock:
+                stats = {'requests': stub.requests, 'rejected': stub.rejected, 'jobs': len(stub.jobs)}
+                return self.__send__(200, dumps(stats), 'application/json')
+        return self.__send__(404, "Not found")
+
+    def __serve__(self, stub, body):
+        if stub.latency > 0:
+            time.sleep(stub.latency)
+        if stub.error_rate > 0 and random.random() < stub.error_rate:
+            return self.__send__(500, "Injected error")
+
+        ## jenkins does not mind the double slashes of url + "/api/json", and neither may the stub
+        parsed = urlparse('http://stub' + self.path)
+        query = parse_qs(parsed.query)
+        parts = [p for p in parsed.path.split('/') if p]
+        ## every view shows every job
+        if len(parts) >= 2 and parts[0] == 'view':
+            parts = parts[2:]
+
+        if self.command == 'HEAD' or parts == []:
+            return self.__send__(200)
+        if parts == ['api', 'json']:
+            return self.__send__(200, dumps(self.__listing__(query.get('tree', [''])[0])), 'application/json')
+        if parts == ['pluginManager', 'api', 'json']:
+            plugins = [{'shortName': 'plugin-{0}'.format(i), 'version': '1.{0}'.format(i)} for i in range(stub.plugins_count)]
+            return self.__send__(200, dumps({'plugins': plugins}), 'application/json')
+        if parts == ['createItem']:
+            return self.__send__(*self.__create__(query, body))
+        if len(parts) == 3 and parts[0] == 'job':
+            return self.__send__(*self.__job__(parts[1], parts[2], body))
+        return self.__send__(404, "Not found")
+
+    def __listing__(self, tree):
+        stub = self.jenkins
+        host = self.headers.get('Host')
+        with stub.lock:
+            names = sorted(stub.jobs.keys())
+            jobs = [{'_class': 'hudson.model.FreeStyleProject',
+                     'name': name,
+                     'url': "http://{0}/job/{1}/".format(host, name),
+                     'color': stub.jobs[name]['color']} for name in names]
+        if 'lastBuild' in tree:
+            ## every job has had one build, which passed
+            for i, job in enumerate(jobs):
+                job['lastBuild'] = {'_class': 'hudson.model.FreeStyleBuild', 'number': 1, 'result': 'SUCCESS',
+                                    'duration': 1000 + i, 'timestamp': stub.started_ms}
+        paging = re.search(r'\{(\d+),(\d+)\}', tree)
+        if paging:
+            jobs = jobs[int(paging.group(1)):int(paging.group(2))]
+        return {'_class': 'hudson.model.Hudson', 'jobs': jobs}
+
+    ## __create__ and __job__ return (status, body, content type) and change the jobs under the lock; the response
+    ## is sent after the lock is released so that a slow client does not hold up the others
+
+    def __create__(self, query, body):
+        stub = self.jenkins
+        name = query.get('name', [''])[0]
+        with stub.lock:
+            if name == '' or stub.jobs.has_key(name):
+                return 400, "A job already exists with the name {0}".format(name)
+            if query.get('mode') == ['copy']:
+                source = stub.jobs.get(query.get('from', [''])[0])
+                if source is None:
+                    return 400, "No such job to copy from"
+                stub.jobs[name] = dict(source)
+            else:
+                stub.jobs[name] = {'xml': body, 'color': 'blue'}
+        return 200, ''
+
+    def __job__(self, name, action, body):
+        stub = self.jenkins
+        with stub.lock:
+            job = stub.jobs.get(name)
+            if job is None:
+                return 404, "No such job {0}".format(name)
+            if action == 'config.xml' and self.command == 'GET':
+                return 200, job['xml'], 'application/xml'
+            if action == 'config.xml':
+                job['xml'] = body
+            elif action == 'enable':
+                job['color'] = 'blue'
+            elif action == 'disable':
+                job['color'] = 'disabled'
+            elif action == 'doDelete':
+                del stub.jobs[name]
+            else:
+                return 404, "Not found"
+        return 200, ''
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs a synthetic jenkins for benchmarking jenkinssai")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080, help="0 picks a free port")
+    parser.add_argument('--jobs', type=int, default=100)
+    parser.add_argument('--payload-bytes', type=int, default=2048, help="size of every config.xml")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with a 500")
+    parser.add_argument('--plugins', type=int, default=150)
+    parser.add_argument('--capacity', type=int, default=None, help="requests served at once, more are answered with a 429")
+    args = parser.parse_args()
+
+    stub = stub_jenkins(args.host, args.port, args.jobs, args.payload_bytes, args.latency, args.error_rate, args.plugins,
+                        capacity=args.capacity)
+    print "Serving {0} jobs on {1}".format(args.jobs, stub.url)
+    sys.stdout.flush()
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -1,33 +1,47 @@
 from json import dumps
+from io import BytesIO
 import click
-import jenkinssai
+import importlib
+import csv
+import glob
 import os
+import re
 import time
-from yaml import load as yaml_load, YAMLError
-import codecs
-from prettytable import PrettyTable
+
+class __lazy_module__(object):
+    """Stands in for a module and imports it on first use, so that commands which never need it, and --help, do not
+    pay for importing it."""
+
+    def __init__(self, name):
+        self.__dict__['name'] = name
+        self.__dict__['module'] = None
+        self.__dict__['hooks'] = list()
+
+    def when_imported(self, hook):
+        """Calls hook(module) as soon as the module is imported, or right away if it already is."""
+        if self.module is None:
+            self.hooks.append(hook)
+        else:
+            hook(self.module)
+
+    def __getattr__(self, attr):
+        if self.module is None:
+            self.__dict__['module'] = importlib.import_module(self.name)
+            for hook in self.hooks:
+                hook(self.module)
+        return getattr(self.module, attr)
+
+## jenkinssai pulls in httplib2 and prettytable is slow to import; both are only loaded by the commands that use them
+jenkinssai = __lazy_module__('jenkinssai')
+prettytable = __lazy_module__('prettytable')
 
 def __getJenkinsHostFromURL__(*urls):
-    return [jenkins_url.split('http://')[-1].split('https://')[-1].split('www')[-1].split('/')[0].split(':')[0] for jenkins_url in urls]
+    return [jenkinssai.host_of(jenkins_url) for jenkins_url in urls]
 
 def getCredsFromYaml(yaml_file, jenkins_url):
 
     try:
-        with open(yaml_file) as f:
-            conf = yaml_load(f)
-            jenkins_host = __getJenkinsHostFromURL__(jenkins_url)[0]
-            if conf.has_key(jenkins_host):
-                return (conf[jenkins_host]['user'], conf[jenkins_host]['pass'])
-
-        return(None, None)
-    except IOError as e:
-        print "Error reading file ", yaml_file
-        print str(e.message)
-        exit(2)
-    except YAMLError, exc:
-        print "Error in yaml file ", yaml_file
-        print exc
-        exit(2)
+        return jenkinssai.get_credential_store(yaml_file).lookup(jenkins_url)
     except Exception as e:
         print e.message
         exit(2)
@@ -50,17 +64,101 @@ def getCreds(yaml_file, jenkins_url, user_opt=None, pass_opt=None):
         user_opt, pass_opt = None, None
     return user_opt, pass_opt
 
-def cleanup(dir_name):
-    if os.path.isdir(dir_name):
-        for f in os.listdir(dir_name):
-            os.remove(os.path.join(dir_name, f))
-        os.rmdir(dir_name)
+def __run_job_action__(action, j_jobs, done_message, concurrency):
+    """Runs action(job) for every job on a bounded pool, reports per job results in order and prints a summary.
+    Returns the number of failed jobs; callers exit with status 1 when it is not 0, so that scripts notice."""
+
+    def report(job, success, result):
+        click.echo("=== Job: "+job)
+        if success:
+            click.echo("\t "+done_message)
+        else:
+            click.echo("\t "+str(result.message))
+
+    results = jenkinssai.run_bulk(action, j_jobs, concurrency=concurrency, on_result=report)
+    failed = [job for job, success, _ in results if not success]
+
+    click.echo("")
+    click.echo("=== Summary: %d succeeded, %d failed" % (len(results) - len(failed), len(failed)))
+    if len(failed) > 0:
+        click.echo("\tFailed jobs: "+", ".join(failed))
+    return len(failed)
+
+class __record_writer__(object):
+    """Writes records (dicts) to stdout one line each, as soon as each is given, in ndjson or in csv with a header
+    line of fields. Nothing is buffered, so a consumer like jq can start on the first record while the rest is still
+    being fetched."""
+
+    def __init__(self, output_format, fields):
+        self.output_format = output_format
+        self.fields = fields
+        if output_format == 'csv':
+            self.__csv_line__(fields)
+
+    def __csv_line__(self, values):
+        line = BytesIO()
+        csv.writer(line, lineterminator='').writerow(
+            ['' if v is None else (v.encode('utf-8') if isinstance(v, unicode) else v) for v in values])
+        click.echo(line.getvalue())
+
+    def write(self, record):
+        if self.output_format == 'csv':
+            self.__csv_line__([record.get(field) for field in self.fields])
+        else:
+            click.echo(dumps(dict((field, record.get(field)) for field in self.fields), sort_keys=True))
+
+def __echo_json_list__(items):
+    """Echoes items as dumps(list(items), indent=4) would, one item at a time instead of after building the list."""
+    first = True
+    for item in items:
+        click.echo(('[\n    ' if first else ', \n    ') + dumps(item), nl=False)
+        first = False
+    click.echo('[]' if first else '\n]')
+
+def __enable_metadata_cache__(jenkinssai_module, ttl=0):
+    try:
+        jenkinssai_module.set_metadata_cache(jenkinssai_module.metadata_cache(ttl=ttl))
+    except (IOError, OSError):
+        ## no writable cache directory, carry on without a cache
+        pass
+
+def __profile_requests__(ctx, print_summary, metrics_file):
+    """Collects statistics of every request to jenkins and, when the command is done, prints them to stderr and/or
+    writes them to metrics_file in the OpenMetrics text format."""
+    stats = list()
+
+    def install(jenkinssai_module):
+        stats.append(jenkinssai_module.request_stats())
+        jenkinssai_module.add_hook(stats[0])
+
+    def report():
+        ## nothing was asked of any jenkins if jenkinssai never got imported
+        if len(stats) == 0:
+            return
+        if print_summary:
+            click.echo("", err=True)
+            click.echo(stats[0].summary(), err=True)
+        if metrics_file is not None:
+            with open(metrics_file, 'w') as f:
+                f.write(stats[0].openmetrics())
+
+    jenkinssai.when_imported(install)
+    ctx.call_on_close(report)
 
 @click.group()
 @click.option('-c', '--jenkins-config', 'yaml_config_file', envvar='JENKINS_CONFIG_YAML_FILE', type=click.File('r'),
               help='Jenkins configuration yaml file containing jenkins username and passwords or set environment variable JENKINS_CONFIG_YAML_FILE with path to the yaml file')
+@click.option('--no-cache', 'no_cache', is_flag=True,
+              help="Do not use the local cache of job lists and plugin lists (kept in ~/.jenkinssai/cache or JENKINSSAI_CACHE_DIR); always download them")
+@click.option('--cache-ttl', 'cache_ttl', type=click.FloatRange(0, None), default=0, envvar='JENKINSSAI_CACHE_TTL', show_default=True,
+              help="Seconds a cached job or plugin list is used without asking jenkins, or set environment variable JENKINSSAI_CACHE_TTL. "
+                   "With 0, cached lists are only revalidated, which saves the download only when jenkins sends an ETag or Last-Modified; a stock jenkins does not")
+@click.option('--profile', is_flag=True,
+              help="When done, print the number of requests, their errors and latencies per jenkins host and endpoint to stderr")
+@click.option('--metrics-file', type=click.Path(dir_okay=False, writable=True),
+              help="When done, write the same request statistics as --profile to this file in the OpenMetrics text format")
 @click.pass_context
-def basecli(ctx, yaml_config_file):
+def basecli(ctx, yaml_config_file, no_cache, cache_ttl, profile, metrics_file):
     """
     This is a jenkins parser script developed by Sai Siddartha Thotapalli mostly to do the redundant devops operations.
 
@@ -84,6 +182,9 @@ def basecli(ctx, yaml_config_file):
     where jenkinsurl is http://jenkinsurl.mycompany.com:8080/jenkins. The main key has to be the hostname of jenkins.
     \b
     If the url is http://www.jenkinsurl..., use the key as www.jenkinsurl.
+    \b
+    A key may also have a port and a path, like buildserver:8443/jenkins, to tell apart jenkins instances on one host.
+    The most specific key matching the url is used.
     """
     config_file = None
     if yaml_config_file is not None:
@@ -92,6 +193,11 @@ def basecli(ctx, yaml_config_file):
             config_file = os.path.join(os.getcwd(), config_file)
     ctx.obj['yaml_config_file'] = config_file
 
+    if not no_cache:
+        jenkinssai.when_imported(lambda jenkinssai_module: __enable_metadata_cache__(jenkinssai_module, cache_ttl))
+    if profile or metrics_file is not None:
+        __profile_requests__(ctx, profile, metrics_file)
+
 @basecli.group()
 @click.pass_context
 def jobs(ctx):
@@ -103,84 +209,265 @@ def jobs(ctx):
 @click.option('-j', '--json', 'json_opt', is_flag=True, help="output in json format")
 @click.option('-s', '--shell', 'shell_opt', is_flag=True,
               help="output in a format that may be useful in shell scripting, output may not be as you like it")
+@click.option('--ndjson', 'ndjson_opt', is_flag=True,
+              help="output one json object per job and line (name, url, color), written as soon as the job is listed")
+@click.option('--csv', 'csv_opt', is_flag=True, help="output a csv line per job (name, url, color) after a header line")
+@click.option('-r', '--recursive', is_flag=True, help="Include the jobs inside folders, by their full names like folder/sub/job")
+@click.option('--max-depth', type=int, default=None, help="With --recursive, number of folder levels to descend into. Default: all of them")
 @click.option('-u', '--user', 'user_opt', envvar="JENKINS_USERNAME",
               help="Jenkins User Name or set the environment variable JENKINS_USERNAME")
 @click.option('-p', '--password', 'pass_opt', envvar="JENKINS_PASSWORD",
               help="Jenkins Password or set the environment variable JENKINS_PASSWORD. We will prompt for password, if not supplied")
-def list_jobs(ctx, jenkins, json_opt, shell_opt, user_opt, pass_opt):
+def list_jobs(ctx, jenkins, json_opt, shell_opt, ndjson_opt, csv_opt, recursive, max_depth, user_opt, pass_opt):
     """Lists jobs for the jenkins url provided"""
 
     user_opt, pass_opt = getCreds(ctx.obj['yaml_config_file'], jenkins, user_opt, pass_opt)
 
-    if not (json_opt or shell_opt):
+    if [json_opt, shell_opt, ndjson_opt, csv_opt].count(True) > 1:
+        click.echo("ERROR!!")
+        click.echo("Ambiguous flags. Only one of shell/json/ndjson/csv may be used!!")
+        click.echo("")
+        exit(2)
+
+    if not (json_opt or shell_opt or ndjson_opt or csv_opt):
         click.echo('=== Jobs at %s:' % jenkins)
 
-    if json_opt and shell_opt:
+    try:
+        j = jenkinssai.jenkins(jenkins, user_opt, pass_opt)
+        ## jobs are printed page by page as the listing arrives
+        if recursive:
+            job_infos = (dict(jobInfo, name=jobInfo['fullname']) for jobInfo in j.walk_jobs(max_depth=max_depth) if not jobInfo['folder'])
+        else:
+            job_infos = j.iter_jobs()
+        names = (jobInfo['name'].encode('ASCII') for jobInfo in job_infos)
+
+        if ndjson_opt or csv_opt:
+            writer = __record_writer__('csv' if csv_opt else 'ndjson', ['name', 'url', 'color'])
+            for jobInfo in job_infos:
+                writer.write(jobInfo)
+        elif json_opt:
+            __echo_json_list__(names)
+        elif shell_opt:
+            for job in names:
+                click.echo(job)
+        else:
+            for job in names:
+                click.echo("\t%s" % job)
+    except Exception as e:
+        print "\t",
+        print e.message
+        click.echo("")
+        exit(2)
+
+    if not (json_opt or shell_opt or ndjson_opt or csv_opt):
+        click.echo("")
+
+## Values of --status of jobs status: those of jenkinssai.jenkins.JOB_STATUSES, spelled out so that --help does not
+## have to import jenkinssai, and 'building'.
+JOB_STATUS_CHOICES = ('success', 'failure', 'unstable', 'aborted', 'notbuilt', 'disabled', 'pending', 'unknown', 'building')
+
+@jobs.command('status')
+@click.pass_context
+@click.option('-J', '--jenkins', required=True, help="Jenkins URL or set environment variable JENKINS_URL", envvar="JENKINS_URL")
+@click.option('-S', '--status', 'statuses', multiple=True, type=click.Choice(JOB_STATUS_CHOICES),
+              help="Only the jobs with this status. May be repeated")
+@click.option('-j', '--json', 'json_opt', is_flag=True, help="output in json format")
+@click.option('--ndjson', 'ndjson_opt', is_flag=True,
+              help="output one json object per job and line, written as soon as the job is listed")
+@click.option('--csv', 'csv_opt', is_flag=True, help="output a csv line per job after a header line")
+@click.option('-r', '--recursive', is_flag=True, help="Include the jobs inside folders, by their full names like folder/sub/job")
+@click.option('--max-depth', type=int, default=None, help="With --recursive, number of folder levels to descend into. Default: all of them")
+@click.option('-u', '--user', 'user_opt', envvar="JENKINS_USERNAME",
+              help="Jenkins User Name or set the environment variable JENKINS_USERNAME")
+@click.option('-p', '--password', 'pass_opt', envvar="JENKINS_PASSWORD",
+              help="Jenkins Password or set the environment variable JENKINS_PASSWORD. We will prompt for password, if not supplied")
+def status(ctx, jenkins, statuses, json_opt, ndjson_opt, csv_opt, recursive, max_depth, user_opt, pass_opt):
+    """Lists the status and last build of jobs for the jenkins url provided.
+    The statuses come from one request per page of jobs (and per folder with --recursive), not from one request per job."""
+
+    user_opt, pass_opt = getCreds(ctx.obj['yaml_config_file'], jenkins, user_opt, pass_opt)
+
+    if [json_opt, ndjson_opt, csv_opt].count(True) > 1:
         click.echo("ERROR!!")
-        click.echo("Ambiguous flags. shell and json flags can not be used together!!")
+        click.echo("Ambiguous flags. Only one of json/ndjson/csv may be used!!")
         click.echo("")
         exit(2)
 
+    plain = not (json_opt or ndjson_opt or csv_opt)
+    if plain:
+        click.echo('=== Job statuses at %s:' % jenkins)
+
+    def wanted(record):
+        return len(statuses) == 0 or record['status'] in statuses or (record['building'] and 'building' in statuses)
+
+    counts = dict()
     try:
         j = jenkinssai.jenkins(jenkins, user_opt, pass_opt)
-        names = j.get_jobs()
+        records = (record for record in j.iter_job_statuses(recursive=recursive, max_depth=max_depth) if wanted(record))
+
+        if ndjson_opt or csv_opt:
+            writer = __record_writer__('csv' if csv_opt else 'ndjson',
+                                       ['name', 'status', 'building', 'color', 'number', 'result', 'duration', 'timestamp'])
+            for record in records:
+                writer.write(record)
+        elif json_opt:
+            __echo_json_list__(records)
+        else:
+            for record in records:
+                counts[record['status']] = counts.get(record['status'], 0) + 1
+                last_build = "never built"
+                if record['number'] is not None:
+                    last_build = "#%d %s, %ds, %s" % (record['number'], record['result'] or "BUILDING", (record['duration'] or 0) / 1000,
+                                                      time.strftime("%Y-%m-%d %H:%M:%S", time.localtime((record['timestamp'] or 0) / 1000)))
+                click.echo("\t%-10s%s %s (%s)" % (record['status'], "*" if record['building'] else " ", record['name'], last_build))
     except Exception as e:
         print "\t",
         print e.message
         click.echo("")
         exit(2)
 
-    if json_opt:
-        click.echo(dumps(names, indent=4))
-    elif shell_opt:
-        click.echo('\n'.join(names))
-    else:
-        for job in names:
-            click.echo("\t%s" % job)
-
-    if not (json_opt or shell_opt):
+    if plain:
+        click.echo("")
+        click.echo("=== Summary: " + (", ".join("%d %s" % (counts[s], s) for s in sorted(counts.keys())) or "no jobs"))
         click.echo("")
 
+def __config_files__(from_dir=None, patterns=()):
+    """Maps config.xml files to job names: <dir>/<name>.xml and <dir>/<name>/config.xml are job <name>, and files in
+    sub directories of from_dir are jobs in folders, like <dir>/folder/sub/job.xml for folder/sub/job. Files matched by
+    the glob patterns are named by their file name alone. Returns [(job name, file path)] sorted by name."""
+    def job_name(path):
+        path = os.path.splitext(path)[0]
+        if os.path.basename(path) == 'config':
+            path = os.path.dirname(path)
+        return path.replace(os.sep, '/').strip('/')
+
+    files = dict()
+    def add(name, path):
+        if name == '':
+            raise click.UsageError("Can not tell the job name of %s" % path)
+        if files.has_key(name) and files[name] != path:
+            raise click.UsageError("Both %s and %s are configs of job %s" % (files[name], path, name))
+        files[name] = path
+
+    if from_dir is not None:
+        for dirpath, dirnames, filenames in os.walk(from_dir):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.endswith('.xml'):
+                    path = os.path.join(dirpath, filename)
+                    add(job_name(os.path.relpath(path, from_dir)), path)
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            if os.path.isfile(path):
+                add(job_name(os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+                             if os.path.basename(path) == 'config.xml' else os.path.basename(path)), path)
+    return sorted(files.items())
+
 @jobs.command('create')
 @click.pass_context
-@click.argument('jobname', nargs=-1, required=True)
+@click.argument('jobname', nargs=-1)
 @click.option('-J', '--jenkins', required=True, help="Jenkins URL or set environment variable JENKINS_URL", envvar="JENKINS_URL")
 @click.option('-c', '--config', type=click.File('r'), help="path to config.xml file")
 @click.option('-f', '--copyfrom', help="job to copy from")
+@click.option('--from-dir', 'from_dir', type=click.Path(exists=True, file_okay=False),
+              help="Create a job from every .xml file in this directory: name.xml or name/config.xml creates job name, "
+                   "files in sub directories create jobs in folders (folder/name.xml creates folder/name)")
+@click.option('--glob', 'patterns', multiple=True,
+              help="Create a job from every file matching this pattern (quote it), named after the file: name.xml or name/config.xml creates job name. May be repeated")
+@click.option('--update', is_flag=True, help="With --from-dir or --glob, replace the config of jobs that already exist instead of skipping them")
+@click.option('-n', '--concurrency', default=8, type=click.IntRange(1, None), show_default=True,
+              help="Number of jobs created in parallel")
 @click.option('-u', '--user', 'user_opt', envvar="JENKINS_USERNAME",
               help="Jenkins User Name or set the environment variable JENKINS_USERNAME")
 @click.option('-p', '--password', 'pass_opt', envvar="JENKINS_PASSWORD",
               help="Jenkins Password or set the environment variable JENKINS_PASSWORD. We will prompt for password, if not supplied")
-def create(ctx, jenkins, jobname, config, copyfrom, user_opt, pass_opt):
-    """Create jobs using config.xml or copy from another job"""
-
-    user_opt, pass_opt = getCreds(ctx.obj['yaml_config_file'], jenkins, user_opt, pass_opt)
+def create(ctx, jenkins, jobname, config, copyfrom, from_dir, patterns, update, concurrency, user_opt, pass_opt):
+    """Create jobs using config.xml or copy from another job, or create a job from every config.xml file of a directory
+    (--from-dir) or of a glob pattern (--glob)."""
 
-    if config is None and copyfrom is None:
+    from_files = from_dir is not None or len(patterns) > 0
+    if from_files and (len(jobname) > 0 or config is not None or copyfrom is not None):
+        click.echo("Error: Ambiguous arguments: --from-dir and --glob name the jobs by their files and can not be used with job names, --config or --copyfrom.")
+        click.echo("")
+        exit(2)
+    elif not from_files and len(jobname) == 0:
+        click.echo("Error: No job names given. Use --help flag to see all options.")
+        click.echo("")
+        exit(2)
+    elif not from_files and config is None and copyfrom is None:
         click.echo("Error: Atleast one of config.xml or copyfrom must be provided. Use --help flag to see all options.")
         click.echo("")
         exit(2)
     elif config is not None and copyfrom is not None:
         click.echo("Error: Ambiguous arguments: only one of --copyfrom <jobname> or --config <config.xml file path> is accepted.")
+        click.echo("")
+        exit(2)
+
+    user_opt, pass_opt = getCreds(ctx.obj['yaml_config_file'], jenkins, user_opt, pass_opt)
 
     try:
         j = jenkinssai.jenkins(jenkins, user_opt, pass_opt)
+        existing = set()
+        if from_files:
+            names_files = __config_files__(from_dir, patterns)
+            ## one listing per folder the jobs go into tells which of them already exist, instead of a request per job
+            names = set(name for name, _ in names_files)
+            parents = sorted(set(name.rsplit('/', 1)[0] if '/' in name else '' for name in names))
+
+            def listing(parent):
+                context = "job/"+"/job/".join(parent.split('/')) if parent != '' else ''
+                return [(parent+'/' if parent != '' else '')+jobInfo['name'].encode('ASCII') for jobInfo in j.iter_jobs(context)]
+
+            for parent, success, result in jenkinssai.run_bulk(listing, parents, concurrency):
+                if success:
+                    existing.update(result)
+                elif parent not in names:
+                    ## a folder created by this run has nothing in it yet, any other folder has to be there
+                    raise result
+        else:
+            names_files = [(name, config.name if config is not None else None) for name in jobname]
+        files = dict(names_files)
+    except click.UsageError as e:
+        click.echo("Error: "+e.message)
+        click.echo("")
+        exit(2)
     except Exception as e:
         print "ERROR!!"
         print e.message
         click.echo("")
         exit(2)
 
-    for name in jobname:
-        try:
-            job_url = j.create_job(name=name, configxmlfile=config.name, copyfrom=copyfrom)
+    if len(names_files) == 0:
+        click.echo("No config.xml files found")
+        click.echo("")
+        exit(0)
+
+    def creator(name):
+        if name in existing:
+            if not update:
+                return "skipped", "Already exists, skipped"
+            return "updated", "Updated job at %s" % j.update_job(name, configxmlfile=files[name])
+        return "created", "Created job at %s" % j.create_job(name=name, configxmlfile=files[name], copyfrom=copyfrom)
+
+    outcomes = list()
+    def report(name, success, result):
+        if success:
             click.echo("=== Job %s" % name)
-            click.echo("\tCreated job at %s" % job_url)
-        except Exception as e:
+            click.echo("\t"+result[1])
+            outcomes.append(result[0])
+        else:
             click.echo("=== Failed to create job %s" % name)
-            print "\tError: ",
-            print e.message
+            click.echo("\tError: %s" % result.message)
+            outcomes.append("failed")
+
+    jenkinssai.run_bulk_by_depth(creator, [name for name, _ in names_files], concurrency=concurrency, on_result=report)
+
+    click.echo("")
+    click.echo("=== Summary: %d created, %d updated, %d skipped, %d failed" % tuple(
+        outcomes.count(x) for x in ("created", "updated", "skipped", "failed")))
     click.echo("")
+    if "failed" in outcomes:
+        exit(1)
 
 @jobs.command('config')
 @click.pass_context
@@ -224,11 +511,15 @@ def config(ctx, jobname, jenkins, output_fp, user_opt, pass_opt):
 @click.pass_context
 @click.argument('jobnames', nargs=-1)
 @click.option('-J', '--jenkins', required=True, help="Jenkins URL or set environment variable JENKINS_URL", envvar="JENKINS_URL")
+@click.option('-n', '--concurrency', default=8, type=click.IntRange(1, None), show_default=True,
+              help="Number of jobs to disable in parallel")
+@click.option('-r', '--recursive', is_flag=True, help="Include the jobs inside folders, by their full names like folder/sub/job")
+@click.option('--max-depth', type=int, default=None, help="With --recursive, number of folder levels to descend into. Default: all of them")
 @click.option('-u', '--user', 'user_opt', envvar="JENKINS_USERNAME",
               help="Jenkins User Name or set the environment variable JENKINS_USERNAME")
 @click.option('-p', '--password', 'pass_opt', envvar="JENKINS_PASSWORD",
               help="Jenkins Password or set the environment variable JENKINS_PASSWORD. We will prompt for password, if not supplied")
-def disable_all(ctx, jobnames, jenkins, user_opt, pass_opt):
+def disable_all(ctx, jobnames, jenkins, user_opt, pass_opt, concurrency, recursive, max_depth):
     """Disable all jobs at a jenkins url.
     Disables job names that are passed as arguments. If no arguments are passed, all jobs under the jenkins url are disabled."""
 
@@ -239,7 +530,7 @@ def disable_all(ctx, jobnames, jenkins, user_opt, pass_opt):
         if not len(jobnames) == 0:
             j_jobs = jobnames
         else:
-            j_jobs = j.get_jobs()
+            j_jobs = j.get_jobs(recursive=recursive, max_depth=max_depth)
 
         if len(j_jobs) == 0:
             click.echo("No jobs to disable at %s" % jenkins)
@@ -256,24 +547,24 @@ def disable_all(ctx, jobnames, jenkins, user_opt, pass_opt):
 
     click.echo("Disabling all jobs at %s" % jenkins)
     click.echo("")
-    for job in j_jobs:
-        click.echo("=== Job: "+job)
-        try:
-            j.disable_job(job)
-            click.echo("\t Successfully disabled.")
-        except Exception as e:
-            click.echo("\t "+str(e.message))
+    failed = __run_job_action__(j.disable_job, j_jobs, "Successfully disabled.", concurrency)
     click.echo("")
+    if failed > 0:
+        exit(1)
 
 @jobs.command('enable-all')
 @click.pass_context
 @click.argument('jobnames', nargs=-1)
 @click.option('-J', '--jenkins', required=True, help="Jenkins URL or set environment variable JENKINS_URL", envvar="JENKINS_URL")
+@click.option('-n', '--concurrency', default=8, type=click.IntRange(1, None), show_default=True,
+              help="Number of jobs to enable in parallel")
+@click.option('-r', '--recursive', is_flag=True, help="Include the jobs inside folders, by their full names like folder/sub/job")
+@click.option('--max-depth', type=int, default=None, help="With --recursive, number of folder levels to descend into. Default: all of them")
 @click.option('-u', '--user', 'user_opt', envvar="JENKINS_USERNAME",
               help="Jenkins User Name or set the environment variable JENKINS_USERNAME")
 @click.option('-p', '--password', 'pass_opt', envvar="JENKINS_PASSWORD",
               help="Jenkins Password or set the environment variable JENKINS_PASSWORD. We will prompt for password, if not supplied")
-def enable_all(ctx, jobnames, jenkins, user_opt, pass_opt):
+def enable_all(ctx, jobnames, jenkins, user_opt, pass_opt, concurrency, recursive, max_depth):
     """Enable all jobs at a jenkins url
     Enabes job names that are passed as arguments. If no arguments are passed, all jobs under the jenkins url are enabled."""
 
@@ -284,7 +575,7 @@ def enable_all(ctx, jobnames, jenkins, user_opt, pass_opt):
         if not len(jobnames) == 0:
             j_jobs = jobnames
         else:
-            j_jobs = j.get_jobs()
+            j_jobs = j.get_jobs(recursive=recursive, max_depth=max_depth)
 
         if len(j_jobs) == 0:
             click.echo("No jobs to enable at %s" % jenkins)
@@ -294,24 +585,24 @@ def enable_all(ctx, jobnames, jenkins, user_opt, pass_opt):
         click.echo("ERROR: "+str(e.message))
         exit(2)
 
-    for job in j_jobs:
-        click.echo("=== Job: "+job)
-        try:
-            j.enable_job(job)
-            click.echo("\t Successfully enabled.")
-        except Exception as e:
-            click.echo("\t "+str(e.message))
+    failed = __run_job_action__(j.enable_job, j_jobs, "Successfully enabled.", concurrency)
     click.echo("")
+    if failed > 0:
+        exit(1)
 
 @jobs.command('delete-all')
 @click.pass_context
 @click.argument('jobnames', nargs=-1)
 @click.option('-J', '--jenkins', required=True, help="Jenkins URL or set environment variable JENKINS_URL", envvar="JENKINS_URL")
+@click.option('-n', '--concurrency', default=8, type=click.IntRange(1, None), show_default=True,
+              help="Number of jobs to delete in parallel")
+@click.option('-r', '--recursive', is_flag=True, help="Include the jobs inside folders, by their full names like folder/sub/job")
+@click.option('--max-depth', type=int, default=None, help="With --recursive, number of folder levels to descend into. Default: all of them")
 @click.option('-u', '--user', 'user_opt', envvar="JENKINS_USERNAME",
               help="Jenkins User Name or set the environment variable JENKINS_USERNAME")
 @click.option('-p', '--password', 'pass_opt', envvar="JENKINS_PASSWORD",
               help="Jenkins Password or set the environment variable JENKINS_PASSWORD. We will prompt for password, if not supplied")
-def delete_all(ctx, jobnames, jenkins, user_opt, pass_opt):
+def delete_all(ctx, jobnames, jenkins, user_opt, pass_opt, concurrency, recursive, max_depth):
     """Deletes all jobs under this url. This is irrecoverable. Use with caution.
     Deletes job names that are passed as arguments. If no arguments are passed, all jobs under the jenkins url are deleted."""
 
@@ -322,7 +613,7 @@ def delete_all(ctx, jobnames, jenkins, user_opt, pass_opt):
         if not len(jobnames) == 0:
             j_jobs = jobnames
         else:
-            j_jobs = j.get_jobs()
+            j_jobs = j.get_jobs(recursive=recursive, max_depth=max_depth)
 
         if len(j_jobs) == 0:
             click.echo("No jobs to delete at %s" % jenkins)
@@ -339,14 +630,195 @@ def delete_all(ctx, jobnames, jenkins, user_opt, pass_opt):
     click.echo('\t'+'\n\t'.join(j_jobs))
     click.confirm('Do you want to continue?', abort=True)
 
-    for job in j_jobs:
+    failed = __run_job_action__(j.delete_job, j_jobs, "Successfully deleted.", concurrency)
+    click.echo("")
+    if failed > 0:
+        exit(1)
+
+@jobs.command('backup')
+@click.pass_context
+@click.argument('jobnames', nargs=-1)
+@click.option('-J', '--jenkins', required=True, help="Jenkins URL or set environment variable JENKINS_URL", envvar="JENKINS_URL")
+@click.option('-d', '--store', 'store_dir', default="jenkins_backups", envvar="JENKINS_BACKUP_DIR", show_default=True,
+              help="Directory of the backup store or set environment variable JENKINS_BACKUP_DIR")
+@click.option('-n', '--concurrency', default=8, type=click.IntRange(1, None), show_default=True,
+              help="Number of jobs to fetch in parallel")
+@click.option('-r', '--recursive', is_flag=True, help="Include the jobs inside folders, by their full names like folder/sub/job")
+@click.option('--max-depth', type=int, default=None, help="With --recursive, number of folder levels to descend into. Default: all of them")
+@click.option('-u', '--user', 'user_opt', envvar="JENKINS_USERNAME",
+              help="Jenkins User Name or set the environment variable JENKINS_USERNAME")
+@click.option('-p', '--password', 'pass_opt', envvar="JENKINS_PASSWORD",
+              help="Jenkins Password or set the environment variable JENKINS_PASSWORD. We will prompt for password, if not supplied")
+def backup(ctx, jobnames, jenkins, store_dir, concurrency, recursive, max_depth, user_opt, pass_opt):
+    """Back up config.xml of jobs into a local store.
+    Backs up job names that are passed as arguments. If no arguments are passed, all jobs under the jenkins url are backed up.
+    Each config is stored once by its hash; a backup of unchanged jobs only adds a small manifest to the store."""
+
+    user_opt, pass_opt = getCreds(ctx.obj['yaml_config_file'], jenkins, user_opt, pass_opt)
+
+    try:
+        store = jenkinssai.snapshot_store(store_dir)
+        j = jenkinssai.jenkins(jenkins, user_opt, pass_opt)
+        ## a multibranch project or organization folder is backed up as itself, jenkins computes the jobs inside it
+        j_jobs = jobnames if len(jobnames) > 0 else j.get_jobs(recursive=recursive, max_depth=max_depth, computed=False)
+    except Exception as e:
+        click.echo("ERROR: "+str(e.message))
+        click.echo("")
+        exit(2)
+
+    def report(job, success, result):
         click.echo("=== Job: "+job)
-        try:
-            j.delete_job(job)
-            click.echo("\t Successfully deleted.")
-        except Exception as e:
-            click.echo("\t "+str(e.message))
+        if success:
+            click.echo("\t %s (%s)" % (result[0], "new" if result[1] else "unchanged"))
+        else:
+            click.echo("\t "+str(result.message))
+
+    manifest = store.backup(j, j_jobs, concurrency, report)
+    click.echo("")
+    click.echo("=== Snapshot %s: %d of %d jobs backed up to %s" % (manifest['id'], len(manifest['jobs']), len(j_jobs), store_dir))
+    click.echo("")
+    if len(manifest['jobs']) < len(j_jobs):
+        exit(1)
+
+@jobs.command('snapshots')
+@click.option('-d', '--store', 'store_dir', default="jenkins_backups", envvar="JENKINS_BACKUP_DIR", show_default=True,
+              help="Directory of the backup store or set environment variable JENKINS_BACKUP_DIR")
+def snapshots(store_dir):
+    """Lists the snapshots in a backup store"""
+
+    try:
+        for manifest in jenkinssai.snapshot_store(store_dir).snapshots():
+            click.echo("%s\t%s\t%d jobs\t%s" % (manifest['id'], time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(manifest['created'])),
+                                                 len(manifest['jobs']), manifest['url']))
+    except Exception as e:
+        click.echo("ERROR: "+str(e.message))
+        exit(2)
+
+@jobs.command('restore')
+@click.pass_context
+@click.argument('snapshot')
+@click.argument('jobnames', nargs=-1)
+@click.option('-J', '--jenkins', required=True, help="Jenkins URL or set environment variable JENKINS_URL", envvar="JENKINS_URL")
+@click.option('-d', '--store', 'store_dir', default="jenkins_backups", envvar="JENKINS_BACKUP_DIR", show_default=True,
+              help="Directory of the backup store or set environment variable JENKINS_BACKUP_DIR")
+@click.option('--update', is_flag=True, help="Replace the config of jobs that already exist instead of creating new jobs")
+@click.option('-n', '--concurrency', default=8, type=click.IntRange(1, None), show_default=True,
+              help="Number of jobs to restore in parallel")
+@click.option('-u', '--user', 'user_opt', envvar="JENKINS_USERNAME",
+              help="Jenkins User Name or set the environment variable JENKINS_USERNAME")
+@click.option('-p', '--password', 'pass_opt', envvar="JENKINS_PASSWORD",
+              help="Jenkins Password or set the environment variable JENKINS_PASSWORD. We will prompt for password, if not supplied")
+def restore(ctx, snapshot, jobnames, jenkins, store_dir, update, concurrency, user_opt, pass_opt):
+    """Restore jobs from a snapshot in a backup store.
+    Restores job names that are passed as arguments. If no arguments are passed, all jobs of the snapshot are restored."""
+
+    user_opt, pass_opt = getCreds(ctx.obj['yaml_config_file'], jenkins, user_opt, pass_opt)
+
+    try:
+        store = jenkinssai.snapshot_store(store_dir)
+        j = jenkinssai.jenkins(jenkins, user_opt, pass_opt)
+        results = store.restore(j, snapshot, jobnames, update, concurrency,
+                                lambda job, success, result: click.echo("=== Job: %s\n\t %s" % (job, result if success else result.message)))
+    except Exception as e:
+        click.echo("ERROR: "+str(e.message))
+        click.echo("")
+        exit(2)
+
+    failed = [job for job, success, _ in results if not success]
+    click.echo("")
+    click.echo("=== Summary: %d restored, %d failed" % (len(results) - len(failed), len(failed)))
+    click.echo("")
+    if len(failed) > 0:
+        exit(1)
+
+@jobs.command('export')
+@click.pass_context
+@click.argument('jobnames', nargs=-1)
+@click.option('-J', '--jenkins', required=True, help="Jenkins URL or set environment variable JENKINS_URL", envvar="JENKINS_URL")
+@click.option('-o', '--output', required=True, type=click.Path(dir_okay=False, writable=True),
+              help="Path of the bundle to write, like jobs.tar")
+@click.option('-n', '--concurrency', default=8, type=click.IntRange(1, None), show_default=True,
+              help="Number of jobs to fetch in parallel")
+@click.option('-r', '--recursive', is_flag=True, help="Include the folders and the jobs inside them, by their full names like folder/sub/job")
+@click.option('--max-depth', type=int, default=None, help="With --recursive, number of folder levels to descend into. Default: all of them")
+@click.option('-u', '--user', 'user_opt', envvar="JENKINS_USERNAME",
+              help="Jenkins User Name or set the environment variable JENKINS_USERNAME")
+@click.option('-p', '--password', 'pass_opt', envvar="JENKINS_PASSWORD",
+              help="Jenkins Password or set the environment variable JENKINS_PASSWORD. We will prompt for password, if not supplied")
+def export(ctx, jobnames, jenkins, output, concurrency, recursive, max_depth, user_opt, pass_opt):
+    """Export config.xml of jobs into a single bundle file.
+    Exports job names that are passed as arguments. If no arguments are passed, all jobs under the jenkins url are exported.
+    The bundle is a tar of compressed configs with an index, which jobs import reads without extracting it."""
+
+    user_opt, pass_opt = getCreds(ctx.obj['yaml_config_file'], jenkins, user_opt, pass_opt)
+
+    try:
+        j = jenkinssai.jenkins(jenkins, user_opt, pass_opt)
+        if len(jobnames) > 0:
+            j_jobs = jobnames
+        elif recursive:
+            ## folders are exported too, so that import can create them before the jobs inside them; the jobs jenkins
+            ## computes inside a multibranch project or organization folder are not, it creates them again by itself
+            j_jobs = [jobInfo['fullname'].encode('ASCII') for jobInfo in j.walk_jobs(max_depth=max_depth, computed=False)]
+        else:
+            j_jobs = j.get_jobs()
+    except Exception as e:
+        click.echo("ERROR: "+str(e.message))
+        click.echo("")
+        exit(2)
+
+    def report(job, success, result):
+        click.echo("=== Job: "+job)
+        click.echo("\t "+(result['sha1'] if success else str(result.message)))
+
+    try:
+        index = jenkinssai.export_bundle(j, j_jobs, output, concurrency, report)
+    except Exception as e:
+        click.echo("ERROR: "+str(e.message or e))
+        click.echo("")
+        exit(2)
+
+    click.echo("")
+    click.echo("=== Summary: %d of %d jobs exported to %s" % (len(index['jobs']), len(j_jobs), output))
+    click.echo("")
+    if len(index['jobs']) < len(j_jobs):
+        exit(1)
+
+@jobs.command('import')
+@click.pass_context
+@click.argument('bundle', type=click.Path(exists=True, dir_okay=False))
+@click.argument('jobnames', nargs=-1)
+@click.option('-J', '--jenkins', required=True, help="Jenkins URL or set environment variable JENKINS_URL", envvar="JENKINS_URL")
+@click.option('--update', is_flag=True, help="Replace the config of jobs that already exist instead of creating new jobs")
+@click.option('-n', '--concurrency', default=8, type=click.IntRange(1, None), show_default=True,
+              help="Number of jobs to create in parallel")
+@click.option('-u', '--user', 'user_opt', envvar="JENKINS_USERNAME",
+              help="Jenkins User Name or set the environment variable JENKINS_USERNAME")
+@click.option('-p', '--password', 'pass_opt', envvar="JENKINS_PASSWORD",
+              help="Jenkins Password or set the environment variable JENKINS_PASSWORD. We will prompt for password, if not supplied")
+def import_(ctx, bundle, jobnames, jenkins, update, concurrency, user_opt, pass_opt):
+    """Create jobs from a bundle written by jobs export.
+    Imports job names that are passed as arguments. If no arguments are passed, all jobs of the bundle are imported."""
+
+    user_opt, pass_opt = getCreds(ctx.obj['yaml_config_file'], jenkins, user_opt, pass_opt)
+
+    try:
+        b = jenkinssai.job_bundle(bundle)
+        j = jenkinssai.jenkins(jenkins, user_opt, pass_opt)
+        results = b.restore(j, jobnames, update, concurrency,
+                            lambda job, success, result: click.echo("=== Job: %s\n\t %s" % (job, result if success else result.message)))
+        b.close()
+    except Exception as e:
+        click.echo("ERROR: "+str(e.message))
+        click.echo("")
+        exit(2)
+
+    failed = [job for job, success, _ in results if not success]
+    click.echo("")
+    click.echo("=== Summary: %d imported, %d failed" % (len(results) - len(failed), len(failed)))
     click.echo("")
+    if len(failed) > 0:
+        exit(1)
 
 @basecli.command("migrate")
 @click.pass_context
@@ -358,7 +830,15 @@ def delete_all(ctx, jobnames, jenkins, user_opt, pass_opt):
 @click.option('--src-password', 'src_pass_opt', help="Jenkins Password for the source jenkins url. We will prompt for password, if not supplied")
 @click.option('--dest-user', 'dest_user_opt', help="Jenkins User Name for destination jenkins url")
 @click.option('--dest-password', 'dest_pass_opt', help="Jenkins Password for the destination jenkins url. We will prompt for password, if not supplied")
-def migrate(ctx, src, dest, disable, src_user_opt, src_pass_opt, dest_user_opt, dest_pass_opt):
+@click.option('-n', '--concurrency', default=8, type=click.IntRange(1, None), show_default=True,
+              help="Number of parallel workers for each of the fetch, create and disable stages")
+@click.option('-r', '--recursive', is_flag=True, help="Include the jobs inside folders, by their full names like folder/sub/job")
+@click.option('--max-depth', type=int, default=None, help="With --recursive, number of folder levels to descend into. Default: all of them")
+@click.option('--sync', is_flag=True,
+              help="Only create jobs missing on the destination and update jobs whose config differs; skip jobs that are the same on both")
+@click.option('--resume', 'resume', metavar='RUN-ID', default=None,
+              help="Continue an earlier run of this command that was interrupted: jobs it completed are skipped, failed and remaining ones are retried")
+def migrate(ctx, src, dest, disable, src_user_opt, src_pass_opt, dest_user_opt, dest_pass_opt, concurrency, recursive, max_depth, sync, resume):
     """Copy jobs from one jenkins to another and optionally disable jobs on either source or destination jenkins.
     Takes username and password from the yaml config file if provided or if JENKINS_CONFIG_YAML_FILE environment variable is set.
     see release-copy if you would like to move jobs in the same jenkins"""
@@ -368,36 +848,96 @@ def migrate(ctx, src, dest, disable, src_user_opt, src_pass_opt, dest_user_opt,
 
     click.echo("=== Copying jobs from %s to %s" % (src, dest))
     try:
+        ## a run is only resumed with the options it was started with, others would pick or change other jobs
+        journal = jenkinssai.run_journal(resume, command='migrate', src=src, dest=dest, sync=sync, disable=disable,
+                                         recursive=recursive, max_depth=max_depth)
+        click.echo("=== Run %s, to continue it if interrupted use --resume %s" % (journal.run_id, journal.run_id))
+
         src_j = jenkinssai.jenkins(src, src_user_opt, src_pass_opt)
         dest_j = jenkinssai.jenkins(dest, dest_user_opt, dest_pass_opt)
+        folders = set()
+        if recursive:
+            jobs_list = list()
+            ## computed folders are copied without the jobs inside them, jenkins computes those again on the destination
+            for jobInfo in src_j.walk_jobs(max_depth=max_depth, computed=False):
+                jobs_list.append(jobInfo['fullname'].encode('ASCII'))
+                if jobInfo['folder']:
+                    folders.add(jobInfo['fullname'].encode('ASCII'))
+        else:
+            jobs_list = src_j.get_jobs()
 
-        dir_name = ".jenkinshelper_{0}".format(time.time())
-        os.mkdir(dir_name)
+        dest_jobs = set()
+        if sync:
+            if recursive:
+                dest_jobs = set(jobInfo['fullname'].encode('ASCII') for jobInfo in dest_j.walk_jobs(max_depth=max_depth, computed=False))
+            else:
+                dest_jobs = set(dest_j.get_jobs())
     except Exception as e:
         click.echo("ERROR!!")
         click.echo(e.message)
         click.echo("")
         exit(2)
 
-    for job in src_j.get_jobs():
+    def disabler(job, _):
+        disabled_on = list()
+        if job in folders:
+            return disabled_on
+        if disable.lower() == "src" or disable.lower() == 'all':
+            src_j.disable_job(job)
+            disabled_on.append(src)
+        if disable.lower() == "dest" or disable.lower() == 'all':
+            dest_j.disable_job(job)
+            disabled_on.append(dest)
+        return disabled_on
+
+    def fetcher(job, _):
+        src_xml = src_j.get_job_config_xml(job, output='bytes')
+        dest_xml = dest_j.get_job_config_xml(job, output='bytes') if job in dest_jobs else None
+        return src_xml, dest_xml
+
+    def syncer(job, configs):
+        src_xml, dest_xml = configs
+        if dest_xml is None:
+            return "created: %s" % dest_j.create_job(job, configxml=src_xml)
+        elif jenkinssai.config_digest(src_xml) == jenkinssai.config_digest(dest_xml):
+            return "unchanged, skipped"
+        return "updated: %s" % dest_j.update_job(job, configxml=src_xml)
+
+    ## config.xml is handed from the fetch stage to the create stage in memory, never through the disk
+    if sync:
+        stages = [(journal.stage('fetched', fetcher, skip_after=('created',), keep_result=False), concurrency),
+                  (journal.stage('created', syncer), concurrency)]
+    else:
+        stages = [(journal.stage('fetched', lambda job, _: src_j.get_job_config_xml(job, output='bytes'),
+                                 skip_after=('created',), keep_result=False), concurrency),
+                  (journal.stage('created', lambda job, xml: dest_j.create_job(job, configxml=xml)), concurrency)]
+    if disable is not None:
+        stages.append((journal.stage('disabled', disabler), concurrency))
+
+    ## the summary is counted as jobs are reported, so that their configs need not be kept until the end
+    outcomes = list()
+    def report(job, success, values):
+        synced = len(values) > 1 and not isinstance(values[1], Exception)
+        outcomes.append(values[1].split(':')[0] if synced else "failed")
         click.echo("    === %s" % job)
-        try:
-            config_file_ = "{0}/config_{1}.xml".format(dir_name, job)
-            conf_file = src_j.get_job_config_xml(job, outputfile=config_file_)
-            job_location = dest_j.create_job(job, configxmlfile=conf_file)
-            click.echo("        %s" % job_location)
-            if disable is not None:
-                if disable.lower() == "src" or disable.lower() == 'all':
-                    src_j.disable_job(job)
-                    click.echo("        Job %s disabled on %s" % (job, src))
-                if disable.lower() == "dest" or disable.lower() == 'all':
-                    dest_j.disable_job(job)
-                    click.echo("        Job %s disabled on %s" % (job, dest))
-        except Exception as e:
-            print "    ERROR: ",
-            print e.message
-
-    cleanup(dir_name)
+        if synced:
+            click.echo("        %s" % values[1])
+        if len(values) > 2 and not isinstance(values[2], Exception):
+            for url_ in values[2]:
+                click.echo("        Job %s disabled on %s" % (job, url_))
+        if not success:
+            click.echo("    ERROR: %s" % values[-1].message)
+
+    results = jenkinssai.run_by_depth(jobs_list, lambda level: jenkinssai.run_pipeline(level, stages, queue_size=2*concurrency,
+                                                                                       on_result=report, collect=False))
+    journal.close()
+
+    if sync:
+        click.echo("")
+        click.echo("=== Summary: %d created, %d updated, %d unchanged, %d failed" % tuple(
+            outcomes.count(x) for x in ("created", "updated", "unchanged, skipped", "failed")))
+    if len([job for job, success, _ in results if not success]) > 0:
+        exit(1)
 
 @basecli.command('release-copy')
 @click.pass_context
@@ -406,11 +946,16 @@ def migrate(ctx, src, dest, disable, src_user_opt, src_pass_opt, dest_user_opt,
 @click.option('-T', '--name-translate', 'job_name_translator', type=(str, str), multiple=False, required=True,
               help="Translation for job name, Format is <src> <dest>. All occurances of <src> will be replaced with <dest>. Make sure that the job name has the <src> string")
 @click.option('-t', '--translate', 'translations', type=(str, str), multiple=True,
-    help="Translation for new job. Format is <src> <dest>. All occurances of <src> will be replaced with <dest>. Make sure that the job name has the <src> string")
+    help="Translation for new job. Format is <src> <dest>. All occurances of <src> will be replaced with <dest>. Make sure that the job name has the <src> string. "
+         "All translations are applied together in a single pass; where sources overlap the longest one wins and replaced text is not translated again")
 @click.option('-D', '--disable',
     help="Disable jobs. Disables jobs from source jenkins url if src, if dest disables jobs from dest url, if all, disables jobs from both src and dest jenkins urls",
     type=click.Choice(['src', 'dest', 'all']))
-def release_copy(ctx, src, dest, job_name_translator, translations, disable):
+@click.option('--resume', 'resume', metavar='RUN-ID', default=None,
+              help="Continue an earlier run of this command that was interrupted: jobs it completed are skipped, failed and remaining ones are retried")
+@click.option('-V', '--view', 'view', default=None,
+              help="Also add the new jobs to this list view of the destination jenkins, all of them with a single update of the view")
+def release_copy(ctx, src, dest, job_name_translator, translations, disable, resume, view):
     """Copy jobs from one view to another, may be from one jenkins to another also. As there can not be two jobs in the same view, translate parameters are needed.
     Two arguments are passed to option -T/--name-translate, like -T src dest; all occurances of src in the job name will be replaced
     with the value of dest and will be used as the new job name."""
@@ -420,7 +965,6 @@ def release_copy(ctx, src, dest, job_name_translator, translations, disable):
     src_user_opt, src_pass_opt = getCreds(ctx.obj['yaml_config_file'], src)
     dest_user_opt, dest_pass_opt = getCreds(ctx.obj['yaml_config_file'], dest)
 
-    dir_name = str()
     done_flag = False
 
     try:
@@ -448,65 +992,189 @@ def release_copy(ctx, src, dest, job_name_translator, translations, disable):
         done_flag = True
 
     if done_flag:
-        cleanup(dir_name)
         exit(2)
 
     try:
         dest_j = jenkinssai.jenkins(dest, dest_user_opt, dest_pass_opt)
-        dir_name = ".jenkinshelper_{0}".format(time.time())
-        os.mkdir(dir_name)
+        journal = jenkinssai.run_journal(resume, command='release-copy', src=src, dest=dest)
+        click.echo("=== Run %s, to continue it if interrupted use --resume %s" % (journal.run_id, journal.run_id))
     except Exception as e:
 
         click.echo("\tERROR: %s\n %s" % (e.message, '\n\n'.join([str(x) for x in e.args])))
-        cleanup(dir_name)
         exit(2)
 
+    translator = jenkinssai.translator([[x.encode('utf8') for x in rep_values] for rep_values in translations])
+    new_jobs = list()
+
     for job in jobs_list:
         click.echo("   === %s" % job)
+        stage = 'fetched'
         try:
-            config_file_ = "{0}/config_{1}.xml".format(dir_name, job)
-            conf_file = src_j.get_job_config_xml(job, outputfile=config_file_)
-
-            ## Update the file with the tokens
-            with codecs.open(conf_file, 'r', encoding='utf8') as in_file:
-                content = in_file.read()
-
-            for rep_values in translations:
-                rep_values_new = [x.encode('utf8') for x in rep_values]
-                content = content.replace(*rep_values_new)
+            new_job_name = job.replace(*job_name_translator)
 
-            with codecs.open(conf_file, 'w', encoding='utf8') as out_file:
-                out_file.write(content)
+            if journal.completed(job, 'created'):
+                click.echo("\tNew job: %s (created by an earlier attempt)" % journal.result(job, 'created'))
+            else:
+                content = src_j.get_job_config_xml(job, output='bytes')
+                journal.record(job, stage)
 
-            new_job_name = job.replace(*job_name_translator)
+                ## Update the config with the tokens
+                stage = 'translated'
+                content, counts = translator.translate(content)
+                for rep_values in translations:
+                    click.echo("\tTranslated %s -> %s: %d" % (rep_values[0], rep_values[1], counts.get(rep_values[0].encode('utf8'), 0)))
+                journal.record(job, stage)
 
-            job_location = dest_j.create_job(new_job_name, configxmlfile=conf_file)
+                stage = 'created'
+                job_location = dest_j.create_job(new_job_name, configxml=content)
+                journal.record(job, stage, job_location)
 
-            click.echo("\tNew job: %s" % job_location)
+                click.echo("\tNew job: %s" % job_location)
+            new_jobs.append(new_job_name)
 
-            if disable is not None:
+            if disable is not None and not journal.completed(job, 'disabled'):
+                stage = 'disabled'
                 if disable.lower() in ["src", "all"]:
                     src_j.disable_job(job)
                     click.echo("\tJob %s disabled on %s" % (job, src))
                 if disable.lower() in ["dest", "all"]:
                     dest_j.disable_job(new_job_name)
                     click.echo("\tJob %s disabled on %s" % (job, dest))
+                journal.record(job, stage)
 
         except Exception as e:
+            journal.record(job, stage, error=e.message)
             click.echo("\tERROR: %s\n %s" % (e.message, '\n\n'.join([str(x) for x in e.args])))
 
-    cleanup(dir_name)
+    if view is not None and len(new_jobs) > 0:
+        click.echo("   === View %s" % view)
+        try:
+            ## views belong to the jenkins, not to the view that dest may point at
+            root_j = jenkinssai.jenkins(re.sub(r'(/view/[^/]+)+/*$', '', dest.rstrip('/')), dest_user_opt, dest_pass_opt)
+            added = root_j.add_jobs_to_view(view, new_jobs)
+            click.echo("\tAdded %d jobs, %d were in it already" % (len(added), len(set(new_jobs)) - len(added)))
+        except Exception as e:
+            click.echo("\tERROR: %s" % e.message)
+
+    journal.close()
     click.echo('')
 
 
+@basecli.group()
+@click.pass_context
+def views(ctx):
+    """Manages views"""
+
+@views.command('list')
+@click.pass_context
+@click.option('-J', '--jenkins', required=True, help="Jenkins URL or set environment variable JENKINS_URL", envvar="JENKINS_URL")
+@click.option('-s', '--shell', 'shell_opt', is_flag=True, help="output one view name per line, without the header")
+@click.option('-u', '--user', 'user_opt', envvar="JENKINS_USERNAME",
+              help="Jenkins User Name or set the environment variable JENKINS_USERNAME")
+@click.option('-p', '--password', 'pass_opt', envvar="JENKINS_PASSWORD",
+              help="Jenkins Password or set the environment variable JENKINS_PASSWORD. We will prompt for password, if not supplied")
+def list_views(ctx, jenkins, shell_opt, user_opt, pass_opt):
+    """Lists views for the jenkins url provided"""
+
+    user_opt, pass_opt = getCreds(ctx.obj['yaml_config_file'], jenkins, user_opt, pass_opt)
+
+    try:
+        view_names = jenkinssai.jenkins(jenkins, user_opt, pass_opt).list_views()
+    except Exception as e:
+        click.echo("ERROR: "+str(e.message))
+        click.echo("")
+        exit(2)
+
+    if shell_opt:
+        for view in view_names:
+            click.echo(view)
+    else:
+        click.echo('=== Views at %s:' % jenkins)
+        for view in view_names:
+            click.echo("\t%s" % view)
+        click.echo("")
+
+@views.command('create')
+@click.pass_context
+@click.argument('viewname')
+@click.option('-J', '--jenkins', required=True, help="Jenkins URL or set environment variable JENKINS_URL", envvar="JENKINS_URL")
+@click.option('-c', '--config', type=click.File('rb'), help="path to config.xml file of the view. Default: a list view of no jobs")
+@click.option('-u', '--user', 'user_opt', envvar="JENKINS_USERNAME",
+              help="Jenkins User Name or set the environment variable JENKINS_USERNAME")
+@click.option('-p', '--password', 'pass_opt', envvar="JENKINS_PASSWORD",
+              help="Jenkins Password or set the environment variable JENKINS_PASSWORD. We will prompt for password, if not supplied")
+def create_view(ctx, viewname, jenkins, config, user_opt, pass_opt):
+    """Create a view"""
+
+    user_opt, pass_opt = getCreds(ctx.obj['yaml_config_file'], jenkins, user_opt, pass_opt)
+
+    try:
+        click.echo("=== New view: %s" % jenkinssai.jenkins(jenkins, user_opt, pass_opt).create_view(viewname, config))
+    except Exception as e:
+        click.echo("ERROR: "+str(e.message))
+        click.echo("")
+        exit(2)
+    click.echo("")
+
+def __change_view_jobs__(ctx, viewname, jobnames, jenkins, user_opt, pass_opt, add):
+    user_opt, pass_opt = getCreds(ctx.obj['yaml_config_file'], jenkins, user_opt, pass_opt)
+
+    try:
+        j = jenkinssai.jenkins(jenkins, user_opt, pass_opt)
+        if add:
+            changed = j.add_jobs_to_view(viewname, jobnames)
+        else:
+            changed = j.remove_jobs_from_view(viewname, jobnames)
+    except Exception as e:
+        click.echo("ERROR: "+str(e.message))
+        click.echo("")
+        exit(2)
+
+    for job in changed:
+        click.echo("\t%s %s" % ("Added" if add else "Removed", job))
+    click.echo("")
+    click.echo("=== Summary: %d of %d jobs %s view %s" % (len(changed), len(set(jobnames)), "added to" if add else "removed from", viewname))
+    click.echo("")
+
+@views.command('add')
+@click.pass_context
+@click.argument('viewname')
+@click.argument('jobnames', nargs=-1, required=True)
+@click.option('-J', '--jenkins', required=True, help="Jenkins URL or set environment variable JENKINS_URL", envvar="JENKINS_URL")
+@click.option('-u', '--user', 'user_opt', envvar="JENKINS_USERNAME",
+              help="Jenkins User Name or set the environment variable JENKINS_USERNAME")
+@click.option('-p', '--password', 'pass_opt', envvar="JENKINS_PASSWORD",
+              help="Jenkins Password or set the environment variable JENKINS_PASSWORD. We will prompt for password, if not supplied")
+def add_to_view(ctx, viewname, jobnames, jenkins, user_opt, pass_opt):
+    """Add jobs to a list view.
+    All jobs are added with a single update of the view's config.xml, however many there are."""
+    __change_view_jobs__(ctx, viewname, jobnames, jenkins, user_opt, pass_opt, add=True)
+
+@views.command('remove')
+@click.pass_context
+@click.argument('viewname')
+@click.argument('jobnames', nargs=-1, required=True)
+@click.option('-J', '--jenkins', required=True, help="Jenkins URL or set environment variable JENKINS_URL", envvar="JENKINS_URL")
+@click.option('-u', '--user', 'user_opt', envvar="JENKINS_USERNAME",
+              help="Jenkins User Name or set the environment variable JENKINS_USERNAME")
+@click.option('-p', '--password', 'pass_opt', envvar="JENKINS_PASSWORD",
+              help="Jenkins Password or set the environment variable JENKINS_PASSWORD. We will prompt for password, if not supplied")
+def remove_from_view(ctx, viewname, jobnames, jenkins, user_opt, pass_opt):
+    """Remove jobs from a list view, with a single update of the view's config.xml.
+    The jobs themselves are not deleted."""
+    __change_view_jobs__(ctx, viewname, jobnames, jenkins, user_opt, pass_opt, add=False)
+
 @basecli.group()
 @click.pass_context
 def plugins(ctx):
     """Manages Plugins"""
 
-def __plugin_compares__(jenkinsurls=(), noversions=False, configFile=None):
+def __plugin_compares__(jenkinsurls=(), noversions=False, configFile=None, timeout=None):
+    """Fetches installed plugins from every jenkins concurrently and builds the comparison as results arrive.
+    Returns (comparison, hosts that answered in url order, {host: error} for hosts that failed)."""
     jenkins_hosts = dict()
-    plugins_all = set()
+    output = dict()
+    failures = dict()
 
     for jenkins_url in jenkinsurls:
         h = __getJenkinsHostFromURL__(jenkins_url)[0]
@@ -516,31 +1184,34 @@ def __plugin_compares__(jenkinsurls=(), noversions=False, configFile=None):
 
         jenkins_hosts[h] = dict()
         jenkins_hosts[h]['url'] = jenkins_url
+        jenkins_hosts[h]['creds'] = getCreds(configFile, jenkins_url, user_opt=None, pass_opt=None)
 
-        try:
-            j = jenkinssai.plugins(jenkins_hosts[h]['url'],
-                                   *getCreds(configFile, jenkins_url, user_opt=None, pass_opt=None))
-            jenkins_hosts[h]['plugins'] = j.list_installed()
-            plugins_all.update(jenkins_hosts[h]['plugins'].keys())
-        except Exception as e:
-            click.echo("ERROR: "+str(e.message))
-            exit(2)
+    def fetch(h):
+        return jenkinssai.plugins(jenkins_hosts[h]['url'], *jenkins_hosts[h]['creds']).list_installed()
 
-    output = dict()
-    for plugin_ in plugins_all:
-        output[plugin_] = dict()
-        for host, pinfo in jenkins_hosts.items():
-            output[plugin_][host] = dict()
-            ## output[plugin_][host]['url'] = pinfo['url']
-            output[plugin_][host]['exists'] = pinfo['plugins'].has_key(plugin_)
+    def absent():
+        return {'exists': False} if noversions else {'exists': False, 'plugin_version': "Not Found"}
 
-            if not noversions:
-                if output[plugin_][host]['exists']:
-                    output[plugin_][host]['plugin_version'] = pinfo['plugins'][plugin_]
-                else:
-                    output[plugin_][host]['plugin_version'] = "Not Found"
+    answered = list()
+    for h, success, result in jenkinssai.iter_completed(fetch, jenkins_hosts.keys(), concurrency=len(jenkins_hosts), timeout=timeout):
+        if not success:
+            failures[h] = result
+            click.echo("ERROR: %s: %s" % (h, str(result.message)), err=True)
+            continue
+
+        for plugin_ in result.keys():
+            if not output.has_key(plugin_):
+                output[plugin_] = dict((host, absent()) for host in answered)
+        for plugin_ in output.keys():
+            output[plugin_][h] = absent()
+            if result.has_key(plugin_):
+                output[plugin_][h]['exists'] = True
+                if not noversions:
+                    output[plugin_][h]['plugin_version'] = result[plugin_]
+        answered.append(h)
 
-    return output
+    hosts = [h for h in __getJenkinsHostFromURL__(*jenkinsurls) if h in answered]
+    return output, sorted(set(hosts), key=hosts.index), failures
 
 @plugins.command('list')
 @click.pass_context
@@ -598,23 +1269,41 @@ def list_plugins(ctx, jenkins, noversions, json_opt, shell_opt, user_opt, pass_o
 @click.option('-s', '--shell', 'shell_opt', is_flag=True, help="Shell friendly output")
 @click.option('-p', '--pretty-print', 'pretty_print', is_flag=True,
               help="Pretty prints output. Because of the screen sizes, the output may not be as pretty as expected. Works well with two jenkins.")
-def compare(ctx, jenkinsurls, noversions, json_opt, shell_opt, pretty_print):
+@click.option('--ndjson', 'ndjson_opt', is_flag=True,
+              help="Output one json object per plugin and line, with the version on every jenkins (null if not installed)")
+@click.option('--csv', 'csv_opt', is_flag=True,
+              help="Output a csv line per plugin with the version on every jenkins (empty if not installed) after a header line")
+@click.option('--timeout', default=60, type=float, show_default=True,
+              help="Seconds to wait for each jenkins; a jenkins that does not answer in time is reported and left out of the comparison")
+def compare(ctx, jenkinsurls, noversions, json_opt, shell_opt, pretty_print, ndjson_opt, csv_opt, timeout):
     """List installed plugins on the jenkins along with their versions"""
 
     if len(jenkinsurls) < 2:
         click.echo("Atleast two jenkins URLs must be provided for comparison.")
         exit(2)
 
-    if [json_opt, shell_opt, pretty_print].count(True) > 1:
+    if [json_opt, shell_opt, pretty_print, ndjson_opt, csv_opt].count(True) > 1:
         click.echo("ERROR!!")
-        click.echo("Ambiguous flags. Only one of shell/json/pretty-print may be used!!")
+        click.echo("Ambiguous flags. Only one of shell/json/pretty-print/ndjson/csv may be used!!")
         click.echo("")
         exit(2)
 
-    plugins = __plugin_compares__(jenkinsurls, noversions, ctx.obj['yaml_config_file'])
-    jenkins_hosts = __getJenkinsHostFromURL__(*jenkinsurls)
+    plugins, jenkins_hosts, failures = __plugin_compares__(jenkinsurls, noversions, ctx.obj['yaml_config_file'], timeout)
+    if len(jenkins_hosts) == 0:
+        exit(2)
 
-    if json_opt:
+    if ndjson_opt or csv_opt:
+        ## a row is complete only once every jenkins answered; from then on rows are written one at a time
+        writer = __record_writer__('csv' if csv_opt else 'ndjson', ['plugin']+jenkins_hosts)
+        for plugin_name in sorted(plugins.keys()):
+            row = {'plugin': plugin_name}
+            for host in jenkins_hosts:
+                if noversions:
+                    row[host] = plugins[plugin_name][host]['exists']
+                elif plugins[plugin_name][host]['exists']:
+                    row[host] = plugins[plugin_name][host]['plugin_version']
+            writer.write(row)
+    elif json_opt:
         click.echo(dumps(plugins, indent=4))
     elif shell_opt:
         for plugin_name, plugin_info in plugins.items():
@@ -624,7 +1313,7 @@ def compare(ctx, jenkinsurls, noversions, json_opt, shell_opt, pretty_print):
                 )
             )
     elif pretty_print:
-        out_table = PrettyTable(['Plugin']+jenkins_hosts)
+        out_table = prettytable.PrettyTable(['Plugin']+jenkins_hosts)
         out_table.align = 'l'
 
         for plugin_name, plugin_info in plugins.items():
@@ -638,8 +1327,11 @@ def compare(ctx, jenkinsurls, noversions, json_opt, shell_opt, pretty_print):
             for host in jenkins_hosts:
                 click.echo("\t%s: %s" % (host, (plugin_info[host]['exists']) if noversions else plugin_info[host]['plugin_version']))
 
-    if not (shell_opt or json_opt):
+    if not (shell_opt or json_opt or ndjson_opt or csv_opt):
         click.echo()
+    ## the comparison leaves out the jenkins that failed or timed out, which a script must not take for a full one
+    if len(failures) > 0:
+        exit(1)
 
 if __name__ == '__main__':
     basecli(obj={})
@@ -1,4 +1,15 @@
 #from .jenkins_single import jenkins
 #from .jenkins_single import list_jobs
 from .plugins import plugins
-from .jenkins import jenkins, list_jobs
\ No newline at end of file
+from .jenkins import jenkins, list_jobs, iter_jobs, walk_jobs, iter_job_statuses, job_status, config_digest
+from .bulk import run_bulk, run_bulk_by_depth, run_by_depth, run_pipeline, iter_completed, worker_pool
+from .translate import translator
+from .cache import metadata_cache
+from .jenkinsHttpObject import set_metadata_cache
+from .snapshots import snapshot_store
+from .journal import run_journal
+from .credentials import credential_store, get_credential_store, host_of
+from .instrumentation import add_hook, remove_hook, request_stats
+from .jsonstream import iter_array
+from .async_client import async_jenkins, async_plugins, as_completed, gather
+from .bundles import export_bundle, job_bundle
@@ -0,0 +1,178 @@
+import time
+import threading
+from Queue import Queue, Empty
+from exceptions_jenkins import JenkinsException
+from bulk import worker_pool
+from jenkins import jenkins
+from plugins import plugins
+
+## Worker threads shared by the async_jenkins and async_plugins of the process that do not ask for their own.
+ASYNC_WORKERS = 32
+
+class future(object):
+    """Result of an operation started by async_jenkins or async_plugins, available once the operation is done.
+
+    Callbacks added with add_done_callback are called with the future from the worker thread that finished it (or
+    right away if it is already done). To hand the result to an event loop of another framework, schedule it from the
+    callback the way that framework accepts work from other threads."""
+
+    def __init__(self):
+        self.__done__ = threading.Event()
+        self.__lock__ = threading.Lock()
+        self.__callbacks__ = list()
+        self.__result__ = None
+        self.__exc_info__ = None
+
+    def done(self):
+        return self.__done__.is_set()
+
+    def __wait__(self, timeout):
+        ## wait in short steps so that Ctrl-C still reaches the waiting thread
+        deadline = None if timeout is None else time.time() + timeout
+        while not self.__done__.is_set():
+            step = 0.5 if deadline is None else min(0.5, deadline - time.time())
+            if step <= 0:
+                raise JenkinsException("Timed out after {0} seconds".format(timeout))
+            self.__done__.wait(step)
+
+    def result(self, timeout=None):
+        """Value of the operation; raises what the operation raised, or a JenkinsException after timeout seconds."""
+        self.__wait__(timeout)
+        if self.__exc_info__ is not None:
+            raise self.__exc_info__[0], self.__exc_info__[1], self.__exc_info__[2]
+        return self.__result__
+
+    def exception(self, timeout=None):
+        """Exception the operation raised, None if it succeeded."""
+        self.__wait__(timeout)
+        return self.__exc_info__[1] if self.__exc_info__ is not None else None
+
+    def add_done_callback(self, callback):
+        with self.__lock__:
+            if not self.__done__.is_set():
+                self.__callbacks__.append(callback)
+                return
+        callback(self)
+
+    def __finish__(self, result=None, exc_info=None):
+        with self.__lock__:
+            self.__result__ = result
+            self.__exc_info__ = exc_info
+            self.__done__.set()
+            callbacks, self.__callbacks__ = self.__callbacks__, list()
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                ## a failing callback must not take the worker thread down with it
+                pass
+
+def __submit__(pool, func, *args):
+    """Runs func(*args) on pool and returns the future of its result."""
+    f = future()
+    pool.submit(func, args, done=lambda result, exc_info: f.__finish__(result, exc_info))
+    return f
+
+__shared_pool__ = None
+__shared_pool_lock__ = threading.Lock()
+
+def __get_pool__(workers=None):
+    """A pool of its own for a client that asks for a number of workers, otherwise the pool shared by the process."""
+    global __shared_pool__
+    if workers is not None:
+        return worker_pool(workers)
+    with __shared_pool_lock__:
+        if __shared_pool__ is None:
+            __shared_pool__ = worker_pool(ASYNC_WORKERS)
+        return __shared_pool__
+
+def as_completed(futures, timeout=None):
+    """Yields futures as they complete. Raises a JenkinsException if they are not all done within timeout seconds."""
+    finished = Queue()
+    pending = list(futures)
+    for f in pending:
+        f.add_done_callback(finished.put)
+
+    deadline = None if timeout is None else time.time() + timeout
+    for _ in range(len(pending)):
+        while True:
+            step = 0.5 if deadline is None else min(0.5, deadline - time.time())
+            if step <= 0:
+                raise JenkinsException("Timed out after {0} seconds".format(timeout))
+            try:
+                yield finished.get(timeout=step)
+                break
+            except Empty:
+                pass
+
+def gather(futures, timeout=None):
+    """Results of futures in their order; raises the exception of the first one, in that order, that failed."""
+    futures = list(futures)
+    deadline = None if timeout is None else time.time() + timeout
+    return [f.result(None if deadline is None else max(0, deadline - time.time())) for f in futures]
+
+class async_jenkins(object):
+    """Non blocking counterpart of jenkins: the same operations, each returning a future at once.
+
+        j = async_jenkins(url, user, password)
+        configs = dict(zip(names, gather([j.get_job_config_xml(name) for name in names])))
+
+    Operations run on worker threads over the same keep-alive sessions, adaptive limiter, metadata cache and
+    instrumentation as jenkins, so thousands of operations can be started at once and are worked off at the pace each
+    host allows. By default the threads are a pool of ASYNC_WORKERS shared by the process; workers gives the client a
+    pool of its own of that many threads, which bounds the operations it runs at once (each keeps a keep-alive
+    connection to the host while it runs)."""
+
+    def __init__(self, url, username=None, password=None, workers=None):
+        self.url = url
+        self.username = username
+        self.password = password
+        self.jenkins_ = jenkins(url, username, password)
+        self.pool_ = __get_pool__(workers)
+        self.own_pool_ = workers is not None
+
+    def close(self):
+        """Stops the threads of a pool of the client's own once the operations started are done."""
+        if self.own_pool_:
+            self.pool_.shutdown()
+
+    def get_jobs(self, context='', recursive=False, max_depth=None, computed=True):
+        return __submit__(self.pool_, self.jenkins_.get_jobs, context, recursive, max_depth, computed)
+
+    def get_job_config_xml(self, job, outputfile='', output='bytes'):
+        """As jenkins.get_job_config_xml, except that output defaults to 'bytes'."""
+        return __submit__(self.pool_, self.jenkins_.get_job_config_xml, job, outputfile, output)
+
+    def create_job(self, name='', context='', configxml=None, configxmlfile=None, copyfrom=None):
+        return __submit__(self.pool_, self.jenkins_.create_job, name, context, configxml, configxmlfile, copyfrom)
+
+    def update_job(self, name, configxml=None, configxmlfile=None):
+        return __submit__(self.pool_, self.jenkins_.update_job, name, configxml, configxmlfile)
+
+    def enable_job(self, name):
+        return __submit__(self.pool_, self.jenkins_.enable_job, name)
+
+    def disable_job(self, name):
+        return __submit__(self.pool_, self.jenkins_.disable_job, name)
+
+    def delete_job(self, name):
+        return __submit__(self.pool_, self.jenkins_.delete_job, name)
+
+class async_plugins(object):
+    """Non blocking counterpart of plugins, see async_jenkins."""
+
+    def __init__(self, url, username=None, password=None, workers=None):
+        self.url = url
+        self.username = username
+        self.password = password
+        self.plugins_ = plugins(url, username, password)
+        self.pool_ = __get_pool__(workers)
+        self.own_pool_ = workers is not None
+
+    def close(self):
+        """Stops the threads of a pool of the client's own once the operations started are done."""
+        if self.own_pool_:
+            self.pool_.shutdown()
+
+    def list_installed(self):
+        return __submit__(self.pool_, self.plugins_.list_installed)
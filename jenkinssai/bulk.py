@@ -0,0 +1,238 @@
+import sys
+import threading
+import time
+from Queue import Queue, Empty
+from exceptions_jenkins import JenkinsException
+
+class __ordered_reporter__(object):
+    """Collects results by index and hands them to on_result in index order as soon as they are contiguous.
+    An exception raised by on_result is kept and re-raised by finish() in the calling thread, so a failing callback
+    (a closed stdout for instance) can not kill a worker thread and leave the others waiting forever.
+    Without collect, the result part of a tuple is let go once it has been handed to on_result."""
+
+    def __init__(self, count, on_result=None, collect=True):
+        self.results = [None] * count
+        self.on_result = on_result
+        self.collect = collect
+        self.lock = threading.Lock()
+        self.next = 0
+        self.error = None
+
+    def report(self, index, outcome):
+        with self.lock:
+            self.results[index] = outcome
+            while self.next < len(self.results) and self.results[self.next] is not None:
+                if self.on_result is not None and self.error is None:
+                    try:
+                        self.on_result(*self.results[self.next])
+                    except Exception as e:
+                        self.error = e
+                if not self.collect:
+                    item, success, _ = self.results[self.next]
+                    self.results[self.next] = (item, success, None)
+                self.next += 1
+
+    def finish(self, threads):
+        ## join with a timeout so that Ctrl-C still reaches the main thread
+        for t in threads:
+            while t.is_alive():
+                t.join(0.5)
+
+        if self.error is not None:
+            raise self.error
+        return self.results
+
+class worker_pool(object):
+    """Runs submitted calls on at most `workers` daemon threads, started as they are needed and kept until shutdown()
+    so that one pool can serve any number of calls over time."""
+
+    def __init__(self, workers):
+        self.workers = max(1, workers)
+        self.threads = list()
+        self.idle = 0
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.work = Queue()
+
+    def submit(self, func, args=(), kwargs=None, done=None):
+        """Queues func(*args, **kwargs). done(result, exc_info) is called from the worker thread once the call has
+        returned, with exc_info None, or raised, with exc_info from sys.exc_info()."""
+        with self.lock:
+            self.pending += 1
+            if self.pending > self.idle and len(self.threads) < self.workers:
+                t = threading.Thread(target=self.__worker__)
+                t.daemon = True
+                t.start()
+                self.threads.append(t)
+        self.work.put((func, args, kwargs or dict(), done))
+
+    def shutdown(self):
+        """Lets every thread finish the calls already submitted and then stop. Returns the threads."""
+        with self.lock:
+            threads = list(self.threads)
+        for _ in threads:
+            self.work.put(None)
+        return threads
+
+    def __worker__(self):
+        while True:
+            with self.lock:
+                self.idle += 1
+            entry = self.work.get()
+            with self.lock:
+                self.idle -= 1
+                if entry is not None:
+                    self.pending -= 1
+            if entry is None:
+                return
+            func, args, kwargs, done = entry
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                if done is not None:
+                    done(None, sys.exc_info())
+                continue
+            if done is not None:
+                done(result, None)
+
+def run_bulk(func, items, concurrency=8, on_result=None):
+    """Calls func(item) for every item on a pool of at most `concurrency` worker threads.
+
+    Returns a list of (item, success, result) tuples in the same order as items, where result is the value returned
+    by func or the exception it raised. If on_result is given, it is called with each tuple in item order as soon as
+    the tuple and all tuples before it are available, so progress can be reported while work is still running."""
+    items = list(items)
+    reporter = __ordered_reporter__(len(items), on_result)
+    pool = worker_pool(min(concurrency, len(items)))
+
+    def reporter_of(index, item):
+        def done(result, exc_info):
+            reporter.report(index, (item, True, result) if exc_info is None else (item, False, exc_info[1]))
+        return done
+
+    for index, item in enumerate(items):
+        pool.submit(func, (item,), done=reporter_of(index, item))
+
+    return reporter.finish(pool.shutdown())
+
+def run_by_depth(items, run):
+    """Calls run(level) for the job names in items grouped by folder level, shallowest first, so that a folder created
+    from its config exists before the jobs inside it. A level holds the names with the same number of / (full names
+    like folder/sub/job), in the order they have in items. Returns the results of every run, one level after the
+    other."""
+    levels = dict()
+    for item in items:
+        levels.setdefault(item.strip('/').count('/'), list()).append(item)
+
+    results = list()
+    for depth in sorted(levels.keys()):
+        results.extend(run(levels[depth]))
+    return results
+
+def run_bulk_by_depth(func, items, concurrency=8, on_result=None):
+    """run_bulk one folder level at a time, see run_by_depth."""
+    return run_by_depth(items, lambda level: run_bulk(func, level, concurrency, on_result))
+
+def iter_completed(func, items, concurrency=8, timeout=None):
+    """Calls func(item) for every item on at most `concurrency` threads and yields (item, success, result) tuples as
+    soon as each call completes, in completion order.
+
+    If timeout is given, a call still running timeout seconds after it started is yielded as a failure with a
+    JenkinsException and its thread is abandoned, so one hung item can not hold back the others."""
+    pending = list(enumerate(items))
+    pending.reverse()
+    running = dict()
+    finished = Queue()
+
+    def worker(index, item):
+        try:
+            finished.put((index, (item, True, func(item))))
+        except Exception as e:
+            finished.put((index, (item, False, e)))
+
+    while pending or running:
+        while pending and len(running) < max(1, concurrency):
+            index, item = pending.pop()
+            running[index] = (item, time.time())
+            t = threading.Thread(target=worker, args=(index, item))
+            t.daemon = True
+            t.start()
+
+        wait = 0.5
+        if timeout is not None:
+            wait = min(wait, max(0, min(started for _, started in running.values()) + timeout - time.time()))
+        try:
+            index, outcome = finished.get(timeout=wait)
+            if running.pop(index, None) is not None:
+                yield outcome
+        except Empty:
+            pass
+
+        if timeout is not None:
+            for index, (item, started) in running.items():
+                if time.time() - started >= timeout:
+                    del running[index]
+                    yield (item, False, JenkinsException("Timed out after {0} seconds".format(timeout)))
+
+def run_pipeline(items, stages, queue_size=16, on_result=None, collect=True):
+    """Pushes every item through stages, a list of (func, workers) pairs, one stage after the other.
+
+    Every stage has its own worker threads and is fed through a bounded queue, so different items are in different
+    stages at the same time and at most about queue_size items are held between two stages. func is called as
+    func(item, value), where value is what the previous stage returned for that item (None for the first stage).
+
+    Returns a list of (item, success, values) tuples in the same order as items. values holds the return value of
+    every stage the item completed; if a stage raised, success is False and the exception is appended to values and
+    the item skips the remaining stages. on_result is called with each tuple in item order, as in run_bulk.
+
+    The values of every item are kept until the end to be returned, payloads like config.xml included. A caller that
+    gets what it needs from on_result passes collect=False: the values of an item are then let go as soon as it has
+    been reported, and are None in the returned tuples, so memory stays bounded by queue_size."""
+    items = list(items)
+    reporter = __ordered_reporter__(len(items), on_result, collect)
+    queues = [Queue(maxsize=queue_size) for _ in stages]
+    workers = [max(1, n) for _, n in stages]
+    finished = [0] * len(stages)
+    finished_lock = threading.Lock()
+    done = object()
+
+    def worker(stage):
+        func = stages[stage][0]
+        while True:
+            entry = queues[stage].get()
+            if entry is done:
+                break
+            index, item, values = entry
+            try:
+                values = values + [func(item, values[-1] if values else None)]
+            except Exception as e:
+                reporter.report(index, (item, False, values + [e]))
+                continue
+            if stage + 1 < len(stages):
+                queues[stage + 1].put((index, item, values))
+            else:
+                reporter.report(index, (item, True, values))
+
+        ## the last worker of a stage to finish tells the next stage that no more work is coming
+        with finished_lock:
+            finished[stage] += 1
+            last = finished[stage] == workers[stage]
+        if last and stage + 1 < len(stages):
+            for _ in range(workers[stage + 1]):
+                queues[stage + 1].put(done)
+
+    threads = list()
+    for stage in range(len(stages)):
+        for _ in range(workers[stage]):
+            t = threading.Thread(target=worker, args=(stage,))
+            t.daemon = True
+            t.start()
+            threads.append(t)
+
+    if len(stages) > 0:
+        for index, item in enumerate(items):
+            queues[0].put((index, item, []))
+        for _ in range(workers[0]):
+            queues[0].put(done)
+
+    return reporter.finish(threads)
@@ -0,0 +1,154 @@
+import mmap
+import time
+import zlib
+import hashlib
+import tarfile
+import threading
+from io import BytesIO
+from json import loads, dumps
+from exceptions_jenkins import JenkinsException
+from bulk import run_bulk, run_bulk_by_depth
+
+## Compression level of the configs in a bundle.
+BUNDLE_COMPRESSION = 6
+## Version of the bundle layout written by export_bundle.
+BUNDLE_FORMAT = 1
+
+def __gzip__(content):
+    c = zlib.compressobj(BUNDLE_COMPRESSION, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return c.compress(content) + c.flush()
+
+def __gunzip__(content):
+    return zlib.decompress(content, 16 + zlib.MAX_WBITS)
+
+class __bundle_writer__(object):
+    """Appends members to an uncompressed tar and remembers where the data of each one starts."""
+
+    def __init__(self, path):
+        self.tar = tarfile.open(path, 'w', format=tarfile.USTAR_FORMAT)
+        self.lock = threading.Lock()
+        self.objects = dict()
+
+    def add(self, name, data):
+        """Adds member name with data; returns (offset of the data in the file, length of the data)."""
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        info.mode = 0644
+        ## a ustar header is a single block for names of up to 100 characters, so the data starts right after it
+        offset = self.tar.offset + tarfile.BLOCKSIZE
+        self.tar.addfile(info, BytesIO(data))
+        return offset, len(data)
+
+    def add_object(self, content):
+        """Adds content gzip compressed, once however many jobs share it. Returns its index entry."""
+        sha1 = hashlib.sha1(content).hexdigest()
+        with self.lock:
+            if not self.objects.has_key(sha1):
+                offset, length = self.add("objects/{0}.xml.gz".format(sha1), __gzip__(content))
+                self.objects[sha1] = {'sha1': sha1, 'offset': offset, 'length': length, 'size': len(content)}
+            return self.objects[sha1]
+
+    def close(self, index):
+        with self.lock:
+            offset, length = self.add("index.json", dumps(index, sort_keys=True))
+            ## last member, found by job_bundle from the end of the file without reading the rest
+            self.add("index.offset", "{0:020d} {1:020d}".format(offset, length))
+            self.tar.close()
+
+def export_bundle(j, jobs, path, concurrency=8, on_result=None):
+    """Writes the config.xml of every job in jobs, fetched from the jenkins j in parallel, to the bundle at path.
+
+    A bundle is an uncompressed tar of gzip compressed configs, each stored once however many jobs share it, followed
+    by index.json, which maps every job to the offset and length of its config in the file. Configs are written as they
+    arrive, so memory stays bounded by the number of configs in flight. on_result(job, success, result) is called per
+    job in order, result being the index entry of the job or the exception. Returns the index."""
+    writer = __bundle_writer__(path)
+
+    def exporter(job):
+        return writer.add_object(j.get_job_config_xml(job, output='bytes'))
+
+    try:
+        results = run_bulk(exporter, jobs, concurrency, on_result)
+    except Exception:
+        writer.tar.close()
+        raise
+
+    index = {'format': BUNDLE_FORMAT,
+             'url': j.url,
+             'created': time.time(),
+             'jobs': dict((job, result) for job, success, result in results if success)}
+    writer.close(index)
+    return index
+
+class job_bundle(object):
+    """A bundle written by export_bundle, opened for reading without extracting it.
+
+    The file is memory mapped: the index is found from the end of the file and a config is read by slicing the map at
+    the offset the index gives, so only the pages of the configs actually read are loaded."""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            self.file = open(path, 'rb')
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, EnvironmentError) as e:
+            raise JenkinsException("Can not open bundle {0}: {1}".format(path, e.strerror or e))
+
+        try:
+            self.index = loads(self.__read_index__())
+        except ValueError as e:
+            raise JenkinsException("{0} is not a job bundle: {1}".format(path, e))
+        if self.index.get('format') != BUNDLE_FORMAT:
+            raise JenkinsException("{0}: unknown bundle format {1}".format(path, self.index.get('format')))
+
+    def __read_index__(self):
+        ## skip the zero blocks that end a tar; the last block with data holds the data of index.offset
+        end = len(self.map) - tarfile.BLOCKSIZE
+        while end >= 0 and self.map[end:end + tarfile.BLOCKSIZE].count('\0') == tarfile.BLOCKSIZE:
+            end -= tarfile.BLOCKSIZE
+        if end < tarfile.BLOCKSIZE:
+            raise ValueError("no index found")
+        try:
+            header = tarfile.TarInfo.frombuf(self.map[end - tarfile.BLOCKSIZE:end])
+        except tarfile.HeaderError as e:
+            raise ValueError(str(e))
+        if header.name != "index.offset":
+            raise ValueError("no index found")
+        offset, length = [int(x) for x in self.map[end:end + header.size].split()]
+        return self.map[offset:offset + length]
+
+    def jobs(self):
+        """Names of the jobs in the bundle, folders before the jobs inside them."""
+        return sorted([name.encode('utf-8') for name in self.index['jobs'].keys()], key=lambda name: (name.count('/'), name))
+
+    def get(self, job):
+        """config.xml of job."""
+        if not self.index['jobs'].has_key(job):
+            raise JenkinsException("Job {0} is not in bundle {1}".format(job, self.path))
+        entry = self.index['jobs'][job]
+        try:
+            content = __gunzip__(self.map[entry['offset']:entry['offset'] + entry['length']])
+        except zlib.error as e:
+            raise JenkinsException("Config of job {0} in bundle {1} is damaged: {2}".format(job, self.path, e))
+        if hashlib.sha1(content).hexdigest() != entry['sha1']:
+            raise JenkinsException("Config of job {0} in bundle {1} is damaged".format(job, self.path))
+        return content
+
+    def restore(self, j, jobs=None, update=False, concurrency=8, on_result=None):
+        """Creates the jobs of the bundle on the jenkins j, or replaces the configs of existing jobs if update is set,
+        in parallel and one folder level at a time. jobs limits the import to those job names.
+        Returns the results of run_bulk_by_depth."""
+        if jobs is None or len(jobs) == 0:
+            jobs = self.jobs()
+
+        def importer(job):
+            if update:
+                return j.update_job(job, configxml=self.get(job))
+            return j.create_job(job, configxml=self.get(job))
+
+        return run_bulk_by_depth(importer, jobs, concurrency, on_result)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
@@ -0,0 +1,153 @@
+import os
+import time
+import hashlib
+import threading
+from json import loads, dumps
+
+## Default location of the cache, override with the JENKINSSAI_CACHE_DIR environment variable.
+CACHE_DIR = os.environ.get('JENKINSSAI_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.jenkinssai', 'cache'))
+## Seconds an entry is served without asking jenkins at all. After that it is revalidated with a conditional GET.
+## A stock jenkins sends no ETag or Last-Modified with api/json, so with a ttl of 0 the cache only saves requests to
+## servers (or proxies in front of them) that do; the CLI sets it with --cache-ttl or JENKINSSAI_CACHE_TTL.
+CACHE_TTL = 0
+## Size of the cache on disk above which the least recently used entries are evicted.
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+class metadata_cache(object):
+    """On disk cache of jenkins metadata responses (api/json, pluginManager/api/json), one entry per host, credentials
+    and endpoint.
+
+    An entry keeps the response body together with its ETag, Last-Modified and sha1. Entries younger than ttl seconds
+    are served as they are; older ones are sent back to jenkins as If-None-Match/If-Modified-Since so that an unchanged
+    response costs a 304, which only servers sending validators can answer. When jenkins answers with a full body
+    anyway, the sha1 tells whether the entry changed and needs rewriting. invalidate(host) stops every entry of a host
+    stored until then from being served without revalidation, so that a change made through jenkinssai is seen by
+    the next read in this or any other process. The least recently used entries are evicted once the cache outgrows max_bytes."""
+
+    def __init__(self, directory=CACHE_DIR, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def __paths__(self, key):
+        name = os.path.join(self.directory, hashlib.sha1(key).hexdigest())
+        return name+".json", name+".body"
+
+    def __stamp__(self, host):
+        return os.path.join(self.directory, hashlib.sha1("invalidated@"+host).hexdigest()+".stamp")
+
+    def get(self, key, host=None):
+        """Returns the entry for key as a dict with etag, last_modified, sha1, stored_at, fresh and body, or None.
+        An entry of host stored before the last invalidate(host) is never fresh."""
+        meta_file, body_file = self.__paths__(key)
+        try:
+            with open(meta_file, 'rb') as f:
+                entry = loads(f.read())
+            with open(body_file, 'rb') as f:
+                entry['body'] = f.read()
+            ## access time drives the LRU eviction; atime is often not updated by the filesystem
+            os.utime(meta_file, None)
+        except (IOError, OSError, ValueError):
+            return None
+
+        entry['fresh'] = time.time() - entry['stored_at'] < self.ttl
+        if entry['fresh'] and host is not None:
+            try:
+                entry['fresh'] = entry['stored_at'] > os.path.getmtime(self.__stamp__(host))
+            except OSError:
+                pass
+        return entry
+
+    def invalidate(self, host):
+        """Makes every entry of host stored until now stale; called after jenkinssai changed something on host."""
+        with self.lock:
+            try:
+                self.__write__(self.__stamp__(host), '')
+            except (IOError, OSError):
+                pass
+
+    def conditional_headers(self, entry):
+        headers = dict()
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, key, resp, content, entry=None):
+        """Stores content as the entry for key, or only marks entry as revalidated if content did not change."""
+        meta_file, body_file = self.__paths__(key)
+        sha1 = hashlib.sha1(content).hexdigest()
+        meta = {'key': key,
+                'etag': resp.get('etag'),
+                'last_modified': resp.get('last-modified'),
+                'content_type': resp.get('content-type'),
+                'sha1': sha1,
+                'stored_at': time.time()}
+
+        with self.lock:
+            try:
+                if entry is None or entry.get('sha1') != sha1:
+                    self.__write__(body_file, content)
+                self.__write__(meta_file, dumps(meta))
+            except (IOError, OSError):
+                ## a cache that can not be written is only a slower cache
+                return
+            self.__evict__()
+
+    def revalidated(self, key, entry):
+        """Records that jenkins confirmed entry (answered 304) and returns its body."""
+        meta_file, _ = self.__paths__(key)
+        meta = dict((k, v) for k, v in entry.items() if k not in ('body', 'fresh'))
+        meta['stored_at'] = time.time()
+        with self.lock:
+            try:
+                self.__write__(meta_file, dumps(meta))
+            except (IOError, OSError):
+                pass
+        return entry['body']
+
+    def clear(self):
+        with self.lock:
+            for f in os.listdir(self.directory):
+                os.remove(os.path.join(self.directory, f))
+
+    def __write__(self, path, data):
+        ## write and rename, so that a reader in another thread or process never sees half a file
+        tmp = "{0}.{1}.{2}.tmp".format(path, os.getpid(), threading.current_thread().ident)
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.rename(tmp, path)
+
+    def __evict__(self):
+        entries = dict()
+        total = 0
+        for f in os.listdir(self.directory):
+            if not f.endswith(('.json', '.body')):
+                continue
+            path = os.path.join(self.directory, f)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            total += size
+            name = os.path.splitext(path)[0]
+            entries.setdefault(name, [0, 0])
+            entries[name][0] += size
+            if f.endswith('.json'):
+                entries[name][1] = os.path.getmtime(path)
+
+        if total <= self.max_bytes:
+            return
+
+        for name, (size, used) in sorted(entries.items(), key=lambda x: x[1][1]):
+            for path in (name+".json", name+".body"):
+                if os.path.exists(path):
+                    os.remove(path)
+            total -= size
+            if total <= self.max_bytes:
+                break
@@ -0,0 +1,82 @@
+import threading
+from urlparse import urlparse
+from exceptions_jenkins import JenkinsException
+
+## credential_store per yaml file, so that a file is parsed once per process however many urls are looked up.
+__stores__ = dict()
+__stores_lock__ = threading.Lock()
+
+def __parse_url__(url):
+    """Returns (host, port, path) of a jenkins url or yaml key; the scheme is optional and a leading www. is dropped."""
+    url = url.strip()
+    if '://' not in url:
+        url = "http://"+url
+    parsed = urlparse(url)
+
+    host = (parsed.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[len('www.'):]
+    ## keys written for the old www split looked like .jenkinsurl.mycompany.com
+    host = host.lstrip('.')
+
+    try:
+        port = parsed.port
+    except ValueError:
+        port = None
+    return host, port, parsed.path.strip('/')
+
+def host_of(url):
+    """Host name of a jenkins url, without scheme, port, path or a leading www."""
+    return __parse_url__(url)[0]
+
+class credential_store(object):
+    """(user, password) of jenkins instances read from a yaml file like
+
+        jenkinsurl.mycompany.com:
+          user: siddhu
+          pass: apikeyORpassword
+        buildserver:8443/jenkins:
+          user: sai
+          pass: apikeyORpassword
+
+    The file is parsed once into an index of normalized host, optional port and optional path. lookup() of a url
+    returns the entry with the longest matching path, preferring an entry with the url's port over one without."""
+
+    def __init__(self, yaml_file):
+        import yaml
+
+        self.yaml_file = yaml_file
+        self.index = dict()
+
+        try:
+            with open(yaml_file) as f:
+                conf = yaml.safe_load(f) or dict()
+        except IOError as e:
+            raise JenkinsException("Error reading file {0}: {1}".format(yaml_file, e.strerror or e))
+        except yaml.YAMLError as e:
+            raise JenkinsException("Error in yaml file {0}: {1}".format(yaml_file, e))
+
+        if not isinstance(conf, dict):
+            raise JenkinsException("Error in yaml file {0}: expected a mapping of jenkins hosts".format(yaml_file))
+
+        for key, value in conf.items():
+            if isinstance(value, dict) and value.has_key('user') and value.has_key('pass'):
+                self.index[__parse_url__(str(key))] = (value['user'], value['pass'])
+
+    def lookup(self, url):
+        host, port, path = __parse_url__(url)
+        segments = path.split('/') if path else []
+
+        for length in range(len(segments), -1, -1):
+            prefix = '/'.join(segments[:length])
+            for port_ in ([port, None] if port is not None else [None]):
+                if self.index.has_key((host, port_, prefix)):
+                    return self.index[(host, port_, prefix)]
+        return (None, None)
+
+def get_credential_store(yaml_file):
+    """Shared credential_store of yaml_file, parsed on first use."""
+    with __stores_lock__:
+        if not __stores__.has_key(yaml_file):
+            __stores__[yaml_file] = credential_store(yaml_file)
+        return __stores__[yaml_file]
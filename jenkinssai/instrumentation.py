@@ -0,0 +1,180 @@
+import re
+import time
+import threading
+from urlparse import urlparse
+
+## Callables called with a request record for every request a session makes, see add_hook.
+__hooks__ = list()
+__hooks_lock__ = threading.Lock()
+
+## Upper bounds, in seconds, of the latency histogram buckets kept by request_stats.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def add_hook(hook):
+    """Calls hook(record) after every request made through a jenkinsHttpObject.session, from the thread that made it.
+
+    record is a dict with host, method, endpoint (the path with job and view names replaced, like
+    job/{name}/config.xml), status (0 if no response came back), bytes_sent, bytes_received, seconds (time spent on
+    the wire, waiting for a free connection slot excluded), wait (time spent waiting for that slot), cached (True if
+    the metadata cache answered without asking jenkins), error (the exception, or None), attempt (0, or the number of
+    the retry) and limit (the requests the adaptive limiter of the host lets in flight after this one)."""
+    with __hooks_lock__:
+        if hook not in __hooks__:
+            __hooks__.append(hook)
+
+def remove_hook(hook):
+    with __hooks_lock__:
+        if hook in __hooks__:
+            __hooks__.remove(hook)
+
+def hooks_installed():
+    return len(__hooks__) > 0
+
+def emit(record):
+    for hook in list(__hooks__):
+        try:
+            hook(record)
+        except Exception:
+            ## a broken hook must not fail the request it is watching
+            pass
+
+def endpoint_template(url, base_url):
+    """Path of url relative to base_url without the query string, with job and view names replaced by {name}."""
+    path = urlparse(url).path
+    base = urlparse(base_url).path.rstrip('/')
+    if base and path.startswith(base):
+        path = path[len(base):]
+    path = re.sub(r'/+', '/', path).strip('/')
+    return re.sub(r'(^|/)(job|view)/[^/]+', r'\1\2/{name}', path) or '/'
+
+class request_stats(object):
+    """A hook that keeps per host, method and endpoint counts, errors, bytes and a latency histogram.
+
+        stats = request_stats()
+        add_hook(stats)
+        ...
+        print stats.summary()
+
+    openmetrics() renders the same numbers in the OpenMetrics text format, for a textfile collector or a push gateway."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = None
+        self.endpoints = dict()
+        self.limits = dict()
+
+    def __call__(self, record):
+        key = (record['host'], record['method'], record['endpoint'])
+        with self.lock:
+            if self.started is None:
+                self.started = time.time() - record['seconds'] - record['wait']
+            if not self.endpoints.has_key(key):
+                self.endpoints[key] = {'count': 0, 'errors': 0, 'cached': 0, 'retries': 0, 'bytes_sent': 0, 'bytes_received': 0,
+                                       'seconds': 0.0, 'wait': 0.0, 'max': 0.0, 'buckets': [0] * (len(LATENCY_BUCKETS) + 1)}
+            if record.get('limit') is not None:
+                low = min(self.limits.get(record['host'], (None, record['limit']))[1], record['limit'])
+                self.limits[record['host']] = (record['limit'], low)
+            e = self.endpoints[key]
+            e['count'] += 1
+            if record.get('attempt'):
+                e['retries'] += 1
+            if record['error'] is not None or not 200 <= record['status'] < 400:
+                e['errors'] += 1
+            if record['cached']:
+                e['cached'] += 1
+            e['bytes_sent'] += record['bytes_sent']
+            e['bytes_received'] += record['bytes_received']
+            e['seconds'] += record['seconds']
+            e['wait'] += record['wait']
+            e['max'] = max(e['max'], record['seconds'])
+            bucket = len(LATENCY_BUCKETS)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if record['seconds'] <= bound:
+                    bucket = i
+                    break
+            e['buckets'][bucket] += 1
+
+    def snapshot(self):
+        """Copy of the statistics as {(host, method, endpoint): dict}."""
+        with self.lock:
+            return dict((key, dict(e, buckets=list(e['buckets']))) for key, e in self.endpoints.items())
+
+    def concurrency_limits(self):
+        """{host: (last, lowest)} concurrency limit of the adaptive limiter of every host seen."""
+        with self.lock:
+            return dict(self.limits)
+
+    def summary(self):
+        """Per endpoint table of counts and latencies followed by a histogram of the latencies of every endpoint."""
+        endpoints = sorted(self.snapshot().items(), key=lambda x: -x[1]['seconds'])
+        if len(endpoints) == 0:
+            return "No requests made"
+
+        lines = ["=== Requests to jenkins, {0:.2f}s since the first one".format(time.time() - self.started),
+                 "{0:<22} {1:<5} {2:<32} {3:>6} {4:>6} {5:>7} {6:>7} {7:>9} {8:>8} {9:>8} {10:>8}".format(
+                     'host', 'meth', 'endpoint', 'count', 'errors', 'retries', 'cached', 'total s', 'mean ms', 'max ms', 'wait s')]
+        for (host, method, endpoint), e in endpoints:
+            lines.append("{0:<22} {1:<5} {2:<32} {3:>6} {4:>6} {5:>7} {6:>7} {7:>9.3f} {8:>8.1f} {9:>8.1f} {10:>8.3f}".format(
+                host, method, endpoint, e['count'], e['errors'], e['retries'], e['cached'], e['seconds'],
+                1000 * e['seconds'] / e['count'], 1000 * e['max'], e['wait']))
+
+        limits = self.concurrency_limits()
+        if len(limits) > 0:
+            lines.append("")
+            lines.append("=== Concurrency limit per host")
+            for host in sorted(limits.keys()):
+                lines.append("{0:<22} now {1:.1f}, lowest {2:.1f}".format(host, *limits[host]))
+
+        labels = ["<={0:g}ms".format(1000 * bound) for bound in LATENCY_BUCKETS] + [">{0:g}ms".format(1000 * LATENCY_BUCKETS[-1])]
+        lines.append("")
+        lines.append("=== Latency histograms")
+        for (host, method, endpoint), e in endpoints:
+            lines.append("{0} {1} {2}".format(host, method, endpoint))
+            peak = max(e['buckets'])
+            for label, count in zip(labels, e['buckets']):
+                if count > 0:
+                    lines.append("    {0:>10} {1:>6} {2}".format(label, count, '#' * max(1, 40 * count // peak)))
+        return "\n".join(lines)
+
+    def openmetrics(self):
+        """The statistics in the OpenMetrics text exposition format."""
+        def labels(host, method, endpoint, **extra):
+            pairs = [('host', host), ('method', method), ('endpoint', endpoint)] + sorted(extra.items())
+            return ','.join('{0}="{1}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+
+        endpoints = sorted(self.snapshot().items())
+        lines = list()
+        for metric, field, unit, help_ in [('jenkinssai_requests', 'count', None, "Requests made to jenkins"),
+                                           ('jenkinssai_request_errors', 'errors', None, "Requests that failed or got an error status"),
+                                           ('jenkinssai_request_cached', 'cached', None, "Requests answered by the metadata cache"),
+                                           ('jenkinssai_request_retries', 'retries', None, "Requests that were retries of an earlier one"),
+                                           ('jenkinssai_request_sent_bytes', 'bytes_sent', 'bytes', "Bytes sent in request bodies"),
+                                           ('jenkinssai_request_received_bytes', 'bytes_received', 'bytes', "Bytes received in response bodies")]:
+            lines.append("# TYPE {0} counter".format(metric))
+            if unit is not None:
+                lines.append("# UNIT {0} {1}".format(metric, unit))
+            lines.append("# HELP {0} {1}.".format(metric, help_))
+            for key, e in endpoints:
+                lines.append("{0}_total{{{1}}} {2}".format(metric, labels(*key), e[field]))
+
+        limits = sorted(self.concurrency_limits().items())
+        if len(limits) > 0:
+            lines.append("# TYPE jenkinssai_concurrency_limit gauge")
+            lines.append("# HELP jenkinssai_concurrency_limit Requests the adaptive limiter lets in flight to a host.")
+            for host, (limit, _) in limits:
+                lines.append('jenkinssai_concurrency_limit{{host="{0}"}} {1:.2f}'.format(host, limit))
+
+        metric = 'jenkinssai_request_duration_seconds'
+        lines.append("# TYPE {0} histogram".format(metric))
+        lines.append("# UNIT {0} seconds".format(metric))
+        lines.append("# HELP {0} Time spent on the wire per request.".format(metric))
+        for key, e in endpoints:
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, e['buckets']):
+                cumulative += count
+                lines.append("{0}_bucket{{{1}}} {2}".format(metric, labels(*key, le="{0:g}".format(bound)), cumulative))
+            lines.append("{0}_bucket{{{1}}} {2}".format(metric, labels(*key, le="+Inf"), e['count']))
+            lines.append("{0}_count{{{1}}} {2}".format(metric, labels(*key), e['count']))
+            lines.append("{0}_sum{{{1}}} {2:.6f}".format(metric, labels(*key), e['seconds']))
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
@@ -1,21 +1,153 @@
-from json import loads
+import re
+import hashlib
+import xml.etree.ElementTree as ElementTree
 from exceptions_jenkins import JenkinsException, __check_http_response_error__
 import httplib2
 import os
-from jenkinsHttpObject import __get_jenkins_http_object__
+from io import BytesIO
+from jenkinsHttpObject import __get_jenkins_session__
+from bulk import run_bulk
+from jsonstream import iter_array
+
+def __xml_payload__(xml):
+    """Request body for a config.xml supplied as bytes, unicode or a file like object.
+    Bytes are sent untouched; unicode is sent as ascii with xml character references."""
+    if hasattr(xml, 'read'):
+        xml = xml.read()
+    if isinstance(xml, unicode):
+        return xml.encode('ascii', 'xmlcharrefreplace')
+    return xml
+
+def __job_path__(name):
+    """Path of a job relative to its jenkins; name may be a full name like folder/sub/job."""
+    return "job/"+"/job/".join(name.strip('/').split('/'))
+
+def config_digest(xml):
+    """sha1 of a config.xml, ignoring what jenkins may rewrite by itself when storing it: the xml declaration, line
+    endings and trailing whitespace. Two configs with the same digest configure the job the same way."""
+    xml = re.sub(r'^\s*<\?xml[^>]*\?>', '', xml)
+    lines = xml.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return hashlib.sha1('\n'.join(line.rstrip() for line in lines).strip()).hexdigest()
+
+## Number of jobs requested per api/json call when listing jobs.
+JOBS_PAGE_SIZE = 500
+## Fields of every job requested by iter_jobs, and by iter_job_statuses, which also asks for the last build.
+JOB_FIELDS = 'name,url,color'
+JOB_STATUS_FIELDS = 'name,color,lastBuild[number,result,duration,timestamp]'
+## Status of a job by its color, with the _anime suffix of a building job removed.
+JOB_STATUSES = {'blue': 'success',
+                'red': 'failure',
+                'yellow': 'unstable',
+                'aborted': 'aborted',
+                'notbuilt': 'notbuilt',
+                'disabled': 'disabled',
+                'grey': 'pending'}
+
+def iter_jobs(url, username=None, password=None, page_size=JOBS_PAGE_SIZE, fields=JOB_FIELDS):
+    """Yields a {'name', 'url', 'color'} dict for every job at url.
+    Only those fields are requested (tree=jobs[name,url,color]) and jobs are fetched page_size at a time, so callers
+    can start working on the first jobs before the rest of the listing has arrived. Other fields may be asked for in
+    the tree syntax of jenkins; listings with fields other than JOB_FIELDS change with every build and are not cached."""
+    session_ = __get_jenkins_session__(url, username, password)
+
+    start = 0
+    first_of_page = None
+    while True:
+        params = httplib2.urllib.urlencode({'tree': 'jobs[%s]{%d,%d}' % (fields, start, start + page_size)})
+        url_ = "{0}/api/json?{1}".format(url, params)
+        resp, content = session_.request(url_, "GET", cacheable=(fields == JOB_FIELDS))
+
+        __check_http_response_error__("GET: {0}".format(url_), resp, content)
+
+        ## jobs are decoded one at a time as they are yielded, the page is never held as a whole parsed tree
+        count = 0
+        for jobInfo in iter_array(content, 'jobs'):
+            if count == 0:
+                ## a jenkins too old to understand {start,end} returns everything in one go, and the same jobs again
+                ## for the next page when it holds exactly page_size of them
+                if start > 0 and jobInfo.get('name') == first_of_page:
+                    return
+                first_of_page = jobInfo.get('name')
+            count += 1
+            yield jobInfo
+        ## let go of this page before the next one is fetched
+        content = None
+
+        if count != page_size:
+            break
+        start += page_size
 
 def list_jobs(url, username=None, password=None):
-    http_, headers = __get_jenkins_http_object__(url, username, password)
+    return [jobInfo['name'].encode('ASCII') for jobInfo in iter_jobs(url, username, password)]
+
+## Item classes that hold other jobs and are descended into by walk_jobs.
+FOLDER_CLASSES = ('com.cloudbees.hudson.plugins.folder.Folder',)
+## Folders whose jobs jenkins computes itself, from the branches or repositories it scans. Copying one means copying
+## the folder alone: jenkins recreates the jobs inside it on its next scan and refuses them being created by hand.
+COMPUTED_FOLDER_CLASSES = ('jenkins.branch.OrganizationFolder',
+                           'org.jenkinsci.plugins.workflow.multibranch.WorkflowMultiBranchProject')
+
+def walk_jobs(url, username=None, password=None, max_depth=None, concurrency=8, fields=JOB_FIELDS, computed=True):
+    """Yields every item under url, descending into folders breadth first.
+
+    Each item is the dict from iter_jobs (with the fields asked for) with four more keys: 'fullname' (the path of the
+    item relative to url, like folder/sub/job), 'depth' (0 for items directly under url), 'folder' and 'computed' (a
+    folder of COMPUTED_FOLDER_CLASSES). All items of one depth are yielded before any item of the next one, and the
+    folders of one depth are listed concurrently. Folders deeper than max_depth, and computed folders unless computed
+    is True, are yielded but not descended into; max_depth=None walks the whole tree."""
+    level = [('', url)]
+    depth = 0
+
+    while len(level) > 0:
+        listings = run_bulk(lambda entry: list(iter_jobs(entry[1], username, password, fields=fields)), level, concurrency)
+
+        next_level = list()
+        for (prefix, folder_url), success, result in listings:
+            if not success:
+                raise result
+            for jobInfo in result:
+                jobInfo['fullname'] = prefix + jobInfo['name']
+                jobInfo['depth'] = depth
+                jobInfo['computed'] = jobInfo.get('_class') in COMPUTED_FOLDER_CLASSES
+                jobInfo['folder'] = jobInfo['computed'] or jobInfo.get('_class') in FOLDER_CLASSES
+                yield jobInfo
+
+                descend = jobInfo['folder'] and (computed or not jobInfo['computed'])
+                if descend and (max_depth is None or depth < max_depth):
+                    next_level.append((jobInfo['fullname'] + '/', "{0}/{1}".format(url, __job_path__(jobInfo['fullname']))))
+
+        level = next_level
+        depth += 1
 
-    url = "{0}/api/json".format(url)
-    try:
-        resp, content = http_.request(url, "GET", headers=headers)
-    except httplib2.HttpLib2Error as he:
-        raise JenkinsException(he.message)
+def __view_path__(name):
+    """Path of a view relative to its jenkins."""
+    return "view/"+httplib2.urllib.quote(name.strip('/'), safe='')
 
-    __check_http_response_error__("GET: {0}".format(url), resp, content)
+## config.xml of the view create_view creates when given none: a list view of no jobs.
+LIST_VIEW_XML = ('<hudson.model.ListView><name>{0}</name><filterExecutors>false</filterExecutors>'
+                 '<filterQueue>false</filterQueue><properties class="hudson.model.View$PropertyList"/>'
+                 '<jobNames><comparator class="hudson.util.CaseInsensitiveComparator"/></jobNames>'
+                 '<jobFilters/><recurse>false</recurse></hudson.model.ListView>')
 
-    return [jobInfo['name'].encode('ASCII') for jobInfo in loads(content)['jobs']]
+def job_status(jobInfo):
+    """Flat {'name', 'status', 'building', 'color', 'number', 'result', 'duration', 'timestamp'} dict of a job listed
+    with JOB_STATUS_FIELDS. status is one of the values of JOB_STATUSES, or 'unknown' for an item without a color
+    like a folder; the build fields are None for a job that has never been built."""
+    color = jobInfo.get('color') or ''
+    build = jobInfo.get('lastBuild') or dict()
+    return {'name': jobInfo.get('fullname', jobInfo['name']).encode('ASCII'),
+            'status': JOB_STATUSES.get(color.replace('_anime', ''), 'unknown'),
+            'building': color.endswith('_anime'),
+            'color': color,
+            'number': build.get('number'),
+            'result': build.get('result'),
+            'duration': build.get('duration'),
+            'timestamp': build.get('timestamp')}
+
+def iter_job_statuses(url, username=None, password=None, page_size=JOBS_PAGE_SIZE):
+    """Yields the job_status of every job at url, from one api/json request per page_size jobs."""
+    for jobInfo in iter_jobs(url, username, password, page_size, JOB_STATUS_FIELDS):
+        yield job_status(jobInfo)
 
 class jenkins(object):
     def __init__(self, url, username=None, password=None):
@@ -23,60 +155,176 @@ class jenkins(object):
         self.username = username
         self.password = password
 
-        self.http_, self.base_headers = __get_jenkins_http_object__(self.url, self.username, self.password)
+        self.session_ = __get_jenkins_session__(self.url, self.username, self.password)
+        self.base_headers = self.session_.headers
 
-    def get_jobs(self, context=''):
-        if not context == '':
-            self.url = "%s/context"
-        return list_jobs(self.url if context == '' else "{0}/{1}".format(self.url, context), self.username, self.password)
+    @property
+    def http_(self):
+        return self.session_.http
 
-    def enable_job(self, name):
+    def get_jobs(self, context='', recursive=False, max_depth=None, computed=True):
+        """Names of the jobs at url/context. With recursive, the full names of all jobs in the folders below it, up to
+        max_depth folder levels deep; the folders themselves are left out. Unless computed is True, a computed folder
+        is named in place of the jobs jenkins computed inside it, which is what copying jobs elsewhere needs."""
+        url_ = self.url if context == '' else "{0}/{1}".format(self.url, context)
+        if not recursive:
+            return list_jobs(url_, self.username, self.password)
+        return [jobInfo['fullname'].encode('ASCII')
+                for jobInfo in walk_jobs(url_, self.username, self.password, max_depth, computed=computed)
+                if not jobInfo['folder'] or (jobInfo['computed'] and not computed)]
+
+    def walk_jobs(self, context='', max_depth=None, concurrency=8, computed=True):
+        return walk_jobs(self.url if context == '' else "{0}/{1}".format(self.url, context), self.username, self.password,
+                         max_depth, concurrency, computed=computed)
+
+    def iter_jobs(self, context=''):
+        return iter_jobs(self.url if context == '' else "{0}/{1}".format(self.url, context), self.username, self.password)
+
+    def iter_job_statuses(self, context='', recursive=False, max_depth=None):
+        """Yields the job_status of every job at url/context as the listing arrives. With recursive, also of the jobs
+        in the folders below it, up to max_depth folder levels deep, by their full names; the folders are left out."""
+        url_ = self.url if context == '' else "{0}/{1}".format(self.url, context)
+        if not recursive:
+            return iter_job_statuses(url_, self.username, self.password)
+        return (job_status(jobInfo) for jobInfo in walk_jobs(url_, self.username, self.password, max_depth,
+                                                             fields=JOB_STATUS_FIELDS)
+                if not jobInfo['folder'])
+
+    def get_job_statuses(self, context='', recursive=False, max_depth=None):
+        """List of the job_status of every job at url/context, see iter_job_statuses."""
+        return list(self.iter_job_statuses(context, recursive, max_depth))
+
+    def list_views(self):
+        """Names of the views of the jenkins."""
+        url_ = "{0}/api/json?{1}".format(self.url, httplib2.urllib.urlencode({'tree': 'views[name]'}))
+        resp, content = self.session_.request(url_, "GET", headers=self.base_headers)
+
+        __check_http_response_error__("GET: {0}".format(url_), resp, content)
+        return [viewInfo['name'].encode('ASCII') for viewInfo in iter_array(content, 'views')]
+
+    def create_view(self, name, configxml=None):
+        """Creates view name from configxml (bytes, unicode or a file like object), by default a list view of no jobs.
+        Returns the url of the view."""
+        if name == '':
+            raise JenkinsException('Jenkins new view name is not supplied.')
+        if configxml is None:
+            configxml = LIST_VIEW_XML.format(name.replace('&', '&amp;').replace('<', '&lt;'))
+
+        headers_new = self.base_headers.copy()
+        headers_new.update({"Content-Type": "application/xml; charset=\"UTF-8\""})
+
+        url_ = "{0}/createView?{1}".format(self.url, httplib2.urllib.urlencode({'name': name}))
+        resp, content = self.session_.request(url_, method="POST", headers=headers_new, body=__xml_payload__(configxml))
+        __check_http_response_error__("POST: "+url_, resp, content)
+        return self.url+"/"+__view_path__(name)
+
+    def get_view_config_xml(self, view):
+        url_view = "{0}/{1}/config.xml".format(self.url, __view_path__(view))
+        resp, content = self.session_.request(url_view, method="GET", headers=self.base_headers)
+
+        __check_http_response_error__("GET: "+url_view, resp, content)
+        return content
+
+    def update_view(self, view, configxml):
+        """Replaces config.xml of an existing view with configxml (bytes, unicode or a file like object)."""
+        headers_new = self.base_headers.copy()
+        headers_new.update({"Content-Type": "application/xml; charset=\"UTF-8\""})
+
+        url_view = "{0}/{1}/config.xml".format(self.url, __view_path__(view))
+        resp, content = self.session_.request(url_view, method="POST", headers=headers_new, body=__xml_payload__(configxml))
+        __check_http_response_error__("POST: "+url_view, resp, content)
+        return self.url+"/"+__view_path__(view)
+
+    def __edit_view_jobs__(self, view, edit):
+        """Reads the jobs of list view `view` from its config.xml, lets edit(set of job names) change them and writes
+        the config back if they changed: a GET and a POST however many jobs change. The view is not locked in between,
+        an edit of the view made meanwhile by someone else is lost."""
         try:
-            url_job = "{0}/job/{1}/enable".format(self.url, name)
-            resp, content = self.http_.request(url_job, method="POST", headers=self.base_headers)
-        except httplib2.HttpLib2Error as he:
-            raise JenkinsException(he.message)
+            root = ElementTree.fromstring(self.get_view_config_xml(view))
+        except ElementTree.ParseError as e:
+            raise JenkinsException("config.xml of view {0} can not be parsed: {1}".format(view, e))
+
+        job_names = root.find('jobNames')
+        if job_names is None:
+            raise JenkinsException("View {0} is not a list view, its jobs can not be changed.".format(view))
+
+        entries = job_names.findall('string')
+        before = set(entry.text for entry in entries if entry.text)
+        after = edit(set(before))
+        if after != before:
+            for entry in entries:
+                job_names.remove(entry)
+            ## jenkins keeps the names sorted by CaseInsensitiveComparator
+            for name in sorted(after, key=lambda x: x.lower()):
+                ElementTree.SubElement(job_names, 'string').text = name
+            self.update_view(view, ElementTree.tostring(root))
+        return before, after
+
+    def add_jobs_to_view(self, view, jobs):
+        """Adds jobs to list view `view` with a single rewrite of its config.xml. Returns the jobs that were not in it."""
+        if len(jobs) == 0:
+            raise JenkinsException('No Jobs provided.')
+        before, after = self.__edit_view_jobs__(view, lambda names: names | set(jobs))
+        return sorted(after - before)
+
+    def remove_jobs_from_view(self, view, jobs):
+        """Removes jobs from list view `view` with a single rewrite of its config.xml. Returns the jobs that were in it."""
+        if len(jobs) == 0:
+            raise JenkinsException('No Jobs provided.')
+        before, after = self.__edit_view_jobs__(view, lambda names: names - set(jobs))
+        return sorted(before - after)
+
+    def enable_job(self, name):
+        url_job = "{0}/{1}/enable".format(self.url, __job_path__(name))
+        resp, content = self.session_.request(url_job, method="POST", headers=self.base_headers)
 
         __check_http_response_error__("POST: {0}".format(url_job), resp, content)
         return True
 
     def disable_job(self, name):
-        try:
-            url_job = "{0}/job/{1}/disable/".format(self.url, name)
-            resp, content = self.http_.request(url_job, method="POST", headers=self.base_headers)
-        except httplib2.HttpLib2Error as he:
-            raise JenkinsException(he.message)
+        url_job = "{0}/{1}/disable/".format(self.url, __job_path__(name))
+        resp, content = self.session_.request(url_job, method="POST", headers=self.base_headers)
 
         __check_http_response_error__("POST: {0}".format(url_job), resp, content)
         return True
 
     def delete_job(self, name):
-        try:
-            url_job = "{0}/job/{1}/doDelete".format(self.url, name)
-            resp, content = self.http_.request(url_job, method="POST", headers=self.base_headers)
-        except httplib2.HttpLib2Error as he:
-            raise JenkinsException(he.message)
+        url_job = "{0}/{1}/doDelete".format(self.url, __job_path__(name))
+        resp, content = self.session_.request(url_job, method="POST", headers=self.base_headers)
 
         __check_http_response_error__("POST: {0}".format(url_job), resp, content)
         return True
 
-    def get_job_config_xml(self, job, outputfile=''):
+    def __get_job_config_content__(self, job):
+        url_job = "{0}/{1}/config.xml".format(self.url, __job_path__(job))
+        resp, content = self.session_.request(url_job, method="GET", headers=self.base_headers)
+
+        __check_http_response_error__("GET: "+url_job, resp, content)
+        return content
+
+    def get_job_config_xml(self, job, outputfile='', output='file'):
+        """Fetches config.xml of job. output decides what is returned:
+        'file' writes it to outputfile and returns the path of the file; the default is ./config_<job>.xml, with the
+        slashes of a full name like folder/job turned into underscores,
+        'bytes' returns the payload itself and 'stream' returns it as a file like object; neither touches the disk."""
+
+        if output not in ('file', 'bytes', 'stream'):
+            raise JenkinsException("Unknown output '{0}': use one of file, bytes, stream.".format(output))
+
+        content = self.__get_job_config_content__(job)
+
+        if output == 'bytes':
+            return content
+        elif output == 'stream':
+            return BytesIO(content)
 
         outputfile = outputfile.strip()
 
         if outputfile == '':
-            outputfile = os.path.join(os.getcwd(), 'config_'+job+'.xml')
+            outputfile = os.path.join(os.getcwd(), 'config_'+job.strip('/').replace('/', '_')+'.xml')
         elif not os.path.isabs(outputfile):
             outputfile = os.path.join(os.getcwd(), outputfile)
 
-        url_job = "{0}/job/{1}/config.xml".format(self.url, job)
-        try:
-            resp, content = self.http_.request(url_job, method="GET", headers=self.base_headers)
-        except httplib2.HttpLib2Error as e:
-            raise JenkinsException(e.message)
-
-        __check_http_response_error__("POST: "+url_job, resp, content)
-
         try:
             with open(outputfile, "wb") as f:
                 f.write(content)
@@ -95,33 +343,49 @@ class jenkins(object):
         elif not [copyfrom, configxml, configxmlfile].count(None) == 2:
             raise JenkinsException("Ambiguous arguments: Only one of copyfrom, configxml, configxmlfile should be provided.")
 
+        ## a full name like folder/sub/job is created inside its folder
+        if '/' in name.strip('/'):
+            parent, name = name.strip('/').rsplit('/', 1)
+            context = "/".join([x for x in [context.strip('/'), __job_path__(parent)] if x != ''])
+
         headers_new = self.base_headers.copy()
         headers_new.update({"Content-Type": "application/xml; charset=\"UTF-8\""})
 
         def creater(xml):
-            try:
-                params = httplib2.urllib.urlencode({'name': name})
-                resp, content = self.http_.request(self.url+"/"+context+"/createItem?"+params, method="POST",
-                                                   headers=headers_new, body=xml.encode('ascii', 'xmlcharrefreplace'))
-            except httplib2.HttpLib2Error as e:
-                raise JenkinsException(e.message)
+            params = httplib2.urllib.urlencode({'name': name})
+            resp, content = self.session_.request(self.url+"/"+context+"/createItem?"+params, method="POST",
+                                                  headers=headers_new, body=__xml_payload__(xml))
             __check_http_response_error__("POST: "+self.url+"/"+context+"/createItem?name="+name, resp, content)
             return True
 
         if configxmlfile is not None:
-            #with codecs.open(configxmlfile, 'r', encoding='utf-8') as f:
-            with open(configxmlfile, 'r') as f:
+            with open(configxmlfile, 'rb') as f:
                 creater(f.read())
 
         elif configxml is not None:
             creater(configxml)
         elif copyfrom is not None:
-            try:
-                params = httplib2.urllib.urlencode({'name': name, 'mode': 'copy', 'from': copyfrom})
-                url_ = "{0}/{1}/createItem?{2}".format(self.url, context, params)
-                resp, content = self.http_.request(url_, method="POST", headers=headers_new)
-            except httplib2.HttpLib2Error as e:
-                raise JenkinsException(e.message)
+            params = httplib2.urllib.urlencode({'name': name, 'mode': 'copy', 'from': copyfrom})
+            url_ = "{0}/{1}/createItem?{2}".format(self.url, context, params)
+            resp, content = self.session_.request(url_, method="POST", headers=headers_new)
             __check_http_response_error__("POST: "+url_, resp, content)
 
-        return self.url+"/"+context+"/job/"+name
\ No newline at end of file
+        return self.url+"/"+context+"/job/"+name
+
+    def update_job(self, name, configxml=None, configxmlfile=None):
+        """Replaces config.xml of an existing job with configxml (bytes, unicode or a file like object) or with the
+        contents of configxmlfile."""
+        if [configxml, configxmlfile].count(None) != 1:
+            raise JenkinsException("Exactly one of configxml, configxmlfile should be provided.")
+
+        if configxmlfile is not None:
+            with open(configxmlfile, 'rb') as f:
+                configxml = f.read()
+
+        headers_new = self.base_headers.copy()
+        headers_new.update({"Content-Type": "application/xml; charset=\"UTF-8\""})
+
+        url_job = "{0}/{1}/config.xml".format(self.url, __job_path__(name))
+        resp, content = self.session_.request(url_job, method="POST", headers=headers_new, body=__xml_payload__(configxml))
+        __check_http_response_error__("POST: "+url_job, resp, content)
+        return self.url+"/"+__job_path__(name)
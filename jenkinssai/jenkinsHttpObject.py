@@ -1,22 +1,199 @@
 import httplib2
 from exceptions_jenkins import JenkinsException, __check_http_response_error__
+import instrumentation
+from urlparse import urlparse
+import threading
+import httplib
+import socket
 import base64
+import hashlib
+import time
+import sys
+from limiter import adaptive_limiter, retry_after, backoff, OVERLOAD_STATUSES, MAX_RETRIES
 
-def __get_jenkins_http_object__(url, username=None, password=None):
-    try:
-        if not url.endswith('/'):
-            url = url+"/"
-        h = httplib2.Http(cache=None)
+## Seconds for which a successful reachability probe is trusted.
+PROBE_TTL = 300
+## Seconds for which a failed probe is remembered, so that a jenkins that is restarting or briefly overloaded is
+## probed again soon instead of staying unreachable for PROBE_TTL.
+PROBE_FAILURE_TTL = 5
+
+## Methods that may be sent again when jenkins did not answer or answered that it is overloaded.
+IDEMPOTENT_METHODS = ('GET', 'HEAD')
+
+## metadata_cache used for cacheable requests, see set_metadata_cache. None disables caching.
+__metadata_cache__ = None
+
+def set_metadata_cache(cache):
+    """Makes every session use cache (a jenkinssai.cache.metadata_cache) for cacheable requests; None turns it off."""
+    global __metadata_cache__
+    __metadata_cache__ = cache
+
+## Process wide registry of sessions, keyed by (scheme, host, username, password).
+__sessions__ = dict()
+__sessions_lock__ = threading.Lock()
+## adaptive_limiter of every jenkins host, shared by all sessions to the host.
+__host_limiters__ = dict()
+__host_limiters_lock__ = threading.Lock()
+
+def __get_host_limiter__(host):
+    with __host_limiters_lock__:
+        if not __host_limiters__.has_key(host):
+            __host_limiters__[host] = adaptive_limiter()
+        return __host_limiters__[host]
+
+class session(object):
+    """Keep-alive http connections to one jenkins host for one set of credentials.
 
-        headers = dict()
+    httplib2.Http objects are not thread safe, so every thread gets its own Http object. The connections an
+    Http object opens are kept alive and reused for every later request made to the same host. Requests to a host
+    go through the adaptive_limiter of the host, which all sessions to it share."""
+
+    def __init__(self, url, username=None, password=None):
+        self.url = url if url.endswith('/') else url+"/"
+        self.host = urlparse(url).netloc.lower()
+        self.username = username
+
+        self.headers = dict()
         if username and password:
             cred = base64.b64encode("{0}:{1}".format(username, password).encode('utf-8')).decode()
-            headers = {'Authorization': 'Basic ' + cred}
-
-        resp, content = h.request(url, method='HEAD', headers=headers)
-        __check_http_response_error__("HEAD: %s" % url, resp, content)
-        return (h, headers)
-    except httplib2.HttpLib2Error as he:
-        raise JenkinsException(he.message)
-    except Exception as e:
-        raise JenkinsException(e.message)
+            self.headers = {'Authorization': 'Basic ' + cred}
+        ## cache entries are kept apart per credentials, without writing the password itself into the cache
+        self.__credentials__ = hashlib.sha1(self.headers.get('Authorization', '')).hexdigest()[:16]
+
+        self.__local__ = threading.local()
+        self.__limiter__ = __get_host_limiter__(self.host)
+        self.__probe_lock__ = threading.Lock()
+        self.__probed_at__ = None
+        self.__probe_error__ = None
+
+    @property
+    def http(self):
+        h = getattr(self.__local__, 'http', None)
+        if h is None:
+            h = httplib2.Http(cache=None)
+            self.__local__.http = h
+        return h
+
+    def probe(self):
+        """HEAD the jenkins url once and remember the outcome, for PROBE_TTL seconds if it succeeded and for
+        PROBE_FAILURE_TTL seconds if it failed. Raises JenkinsException if the jenkins is not reachable."""
+        with self.__probe_lock__:
+            ttl = PROBE_TTL if self.__probe_error__ is None else PROBE_FAILURE_TTL
+            if self.__probed_at__ is None or time.time() - self.__probed_at__ > ttl:
+                try:
+                    ## through the limiter and the retries like every other request, so that a HEAD that is dropped
+                    ## or turned away while jenkins is busy does not fail the command on its own
+                    resp, content = self.__send__(self.url, 'HEAD', self.headers, None, '/')
+                    __check_http_response_error__("HEAD: %s" % self.url, resp, content)
+                    self.__probe_error__ = None
+                except httplib2.HttpLib2Error as he:
+                    self.__probe_error__ = JenkinsException(he.message)
+                except JenkinsException as je:
+                    self.__probe_error__ = je
+                except Exception as e:
+                    self.__probe_error__ = JenkinsException("HEAD: %s: %s" % (self.url, e.message or str(e)))
+                self.__probed_at__ = time.time()
+
+        if self.__probe_error__ is not None:
+            raise self.__probe_error__
+
+    def request(self, url, method="GET", headers=None, body=None, cacheable=False):
+        """Sends a request to jenkins and returns (response, content).
+        A cacheable GET is answered from the metadata cache when possible and revalidated with a conditional GET.
+        Any other request that succeeds invalidates the cached entries of the host, as it may have changed them.
+        A GET or HEAD that gets no answer or an overload status (429, 502, 503, 504), and any request turned away with
+        a 429, is retried up to MAX_RETRIES times after a jittered backoff and any Retry-After jenkins asked for."""
+        headers = self.headers if headers is None else headers
+
+        cache, key, entry = __metadata_cache__, None, None
+        if cacheable and method == "GET" and cache is not None:
+            key = "{0}:{1}@{2}".format(self.username or '', self.__credentials__, url)
+            entry = cache.get(key, self.host)
+            if entry is not None:
+                if entry['fresh']:
+                    self.__instrument__(instrumentation.endpoint_template(url, self.url), method, body,
+                                        self.__cached_response__(entry), entry['body'], 0.0, 0.0, cached=True)
+                    return self.__cached_response__(entry), entry['body']
+                headers = dict(headers, **cache.conditional_headers(entry))
+
+        self.probe()
+        resp, content = self.__send__(url, method, headers, body, instrumentation.endpoint_template(url, self.url))
+
+        if key is not None:
+            if resp.status == 304 and entry is not None:
+                return self.__cached_response__(entry), cache.revalidated(key, entry)
+            if resp.status == 200:
+                cache.put(key, resp, content, entry)
+        elif method not in IDEMPOTENT_METHODS and cache is not None and resp.status < 400:
+            cache.invalidate(self.host)
+        return resp, content
+
+    def __send__(self, url, method, headers, body, endpoint):
+        """Sends a request through the limiter of the host, with the retries described in request.
+        Returns (response, content) of the last attempt or raises the error of the last attempt."""
+        attempt = 0
+        while True:
+            queued = time.time()
+            self.__limiter__.acquire()
+            started = time.time()
+            resp, content, error = None, None, None
+            try:
+                resp, content = self.http.request(url, method=method, headers=headers, body=body)
+            except Exception:
+                error = sys.exc_info()
+            seconds = time.time() - started
+
+            ## no answer at all is taken as overload too, unless it is clearly something else like an unknown host
+            dropped = error is not None and isinstance(error[1], (socket.error, httplib.HTTPException))
+            overloaded = dropped or (resp is not None and resp.status in OVERLOAD_STATUSES)
+            wait = retry_after(resp) if overloaded else None
+            self.__limiter__.release(endpoint, seconds, overloaded, wait)
+            self.__instrument__(endpoint, method, body, resp, content, seconds, started - queued,
+                                error=error[1] if error is not None else None, attempt=attempt)
+
+            ## a 429 means the request was turned away before jenkins acted on it, so even a POST is safe to resend
+            retryable = (method in IDEMPOTENT_METHODS and overloaded) or (resp is not None and resp.status == 429)
+            if not retryable or attempt >= MAX_RETRIES:
+                break
+            time.sleep(backoff(attempt))
+            attempt += 1
+
+        if error is not None:
+            if isinstance(error[1], httplib2.HttpLib2Error):
+                raise JenkinsException(error[1].message)
+            raise error[0], error[1], error[2]
+        return resp, content
+
+    def __instrument__(self, endpoint, method, body, resp, content, seconds, wait, cached=False, error=None, attempt=0):
+        if not instrumentation.hooks_installed():
+            return
+        instrumentation.emit({'host': self.host,
+                              'method': method,
+                              'endpoint': endpoint,
+                              'status': resp.status if resp is not None else 0,
+                              'bytes_sent': len(body) if isinstance(body, basestring) else 0,
+                              'bytes_received': len(content) if content is not None else 0,
+                              'seconds': seconds,
+                              'wait': wait,
+                              'cached': cached,
+                              'error': error,
+                              'attempt': attempt,
+                              'limit': self.__limiter__.limit})
+
+    def __cached_response__(self, entry):
+        return httplib2.Response({'status': '200', 'content-type': entry.get('content_type') or 'application/json'})
+
+def __get_jenkins_session__(url, username=None, password=None):
+    parsed = urlparse(url)
+    key = (parsed.scheme.lower(), parsed.netloc.lower(), username, password)
+
+    with __sessions_lock__:
+        if not __sessions__.has_key(key):
+            __sessions__[key] = session(url, username, password)
+        return __sessions__[key]
+
+def __get_jenkins_http_object__(url, username=None, password=None):
+    """Returns the pooled Http object and auth headers for url. Reachability is no longer checked
+    here; it is probed lazily by session.request on the first request to the host."""
+    s = __get_jenkins_session__(url, username, password)
+    return (s.http, s.headers)
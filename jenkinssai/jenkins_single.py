@@ -203,7 +203,7 @@ class jenkins(object):
                     params = httplib2.urllib.urlencode({"name": job})
                     resp, content = self.http_.request("{0}/view/{1}/addJobToView?{2}".format(self.url, view, params),
                                                        "POST", headers=self.headers)
-                    check_http_response_error("POST: "+self.url+"/job/"+job+"/doDelete", resp, content)
+                    check_http_response_error("POST: "+self.url+"/view/"+view+"/addJobToView?"+params, resp, content)
                     jobs_status.append({"job": job, "message": None, "success": True})
             except JenkinsException as je:
                 jobs_status.append({"job": job, "message": je.message, "success": False})
@@ -0,0 +1,102 @@
+import os
+import time
+import threading
+from json import loads, dumps
+from exceptions_jenkins import JenkinsException
+
+## Default directory of run journals, override with the JENKINSSAI_RUNS_DIR environment variable.
+RUNS_DIR = os.environ.get('JENKINSSAI_RUNS_DIR', os.path.join(os.path.expanduser('~'), '.jenkinssai', 'runs'))
+
+class run_journal(object):
+    """Append only journal of a multi job run, such as a migrate, one json line per finished stage of a job.
+
+    The first line describes the run (command and its arguments). Every later line records that a stage ('fetched',
+    'translated', 'created', 'disabled', ...) of a job succeeded or failed. Opening an existing run replays its journal,
+    so a resumed run can skip the stages that already succeeded and retry only the rest."""
+
+    def __init__(self, run_id=None, directory=RUNS_DIR, **description):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.done = dict()
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        if run_id is None:
+            self.run_id = time.strftime("%Y%m%dT%H%M%S") + "-%06d" % (time.time() % 1 * 1000000)
+            self.description = description
+            self.__journal__ = open(self.__path__(), 'ab')
+            self.__append__(dict(description, run=self.run_id, created=time.time()))
+            return
+
+        self.run_id = run_id
+        try:
+            with open(self.__path__(), 'rb') as f:
+                lines = f.read().splitlines()
+        except IOError:
+            raise JenkinsException("No run {0} in {1}".format(run_id, self.directory))
+
+        self.description = loads(lines[0])
+        for line in lines[1:]:
+            try:
+                record = loads(line)
+            except ValueError:
+                ## the last line of a run that was killed while writing it
+                continue
+            if record['status'] == 'ok':
+                self.done.setdefault(record['job'], dict())[record['stage']] = record.get('result')
+            else:
+                self.done.get(record['job'], dict()).pop(record['stage'], None)
+
+        for key, value in description.items():
+            if self.description.get(key) != value:
+                raise JenkinsException("Run {0} was started with {1}={2}, not {3}".format(run_id, key, self.description.get(key), value))
+
+        self.__journal__ = open(self.__path__(), 'ab')
+
+    def __path__(self):
+        return os.path.join(self.directory, self.run_id+".journal")
+
+    def __append__(self, record):
+        with self.lock:
+            self.__journal__.write(dumps(record)+"\n")
+            self.__journal__.flush()
+
+    def completed(self, job, stage):
+        return self.done.has_key(job) and self.done[job].has_key(stage)
+
+    def result(self, job, stage):
+        """Result journaled for a completed stage of job, None if there is none."""
+        return self.done.get(job, dict()).get(stage)
+
+    def record(self, job, stage, result=None, error=None):
+        if error is None:
+            with self.lock:
+                self.done.setdefault(job, dict())[stage] = result
+            self.__append__({'job': job, 'stage': stage, 'status': 'ok', 'result': result, 'time': time.time()})
+        else:
+            self.__append__({'job': job, 'stage': stage, 'status': 'failed', 'error': str(error), 'time': time.time()})
+
+    def stage(self, name, func, skip_after=(), keep_result=True):
+        """Wraps the pipeline stage func(job, value) so that its outcome is journaled as stage `name`, along with its
+        result if keep_result is set (keep it off for results like config payloads that do not belong in a journal).
+        The wrapped stage does not call func for a job that already completed `name`, or any stage in skip_after, and
+        returns the result journaled for it instead (None if there is none). Without keep_result there is nothing to
+        return, so func is called again unless a stage in skip_after completed."""
+        skip_stages = ((name,) if keep_result else ()) + tuple(skip_after)
+
+        def journaled(job, value):
+            for stage in skip_stages:
+                if self.completed(job, stage):
+                    return self.result(job, name)
+            try:
+                result = func(job, value)
+            except Exception as e:
+                self.record(job, name, error=e.message or e)
+                raise
+            self.record(job, name, result if keep_result else None)
+            return result
+        return journaled
+
+    def close(self):
+        self.__journal__.close()
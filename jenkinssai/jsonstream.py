@@ -0,0 +1,92 @@
+import re
+from json import JSONDecoder
+
+## Bytes read at a time from a file like source.
+CHUNK_SIZE = 64 * 1024
+
+__decoder__ = JSONDecoder()
+__whitespace__ = re.compile(r'[ \t\n\r]*')
+__number_tail__ = re.compile(r'[0-9.eE+-]*$')
+
+class __reader__(object):
+    """Buffer over a json document given as a string or a file like object, read CHUNK_SIZE bytes at a time.
+    Text before `start` has been consumed and is dropped once enough of it piles up."""
+
+    def __init__(self, source):
+        if hasattr(source, 'read'):
+            self.read = source.read
+            self.buffer = ''
+            self.eof = False
+        else:
+            self.read = None
+            self.buffer = source
+            self.eof = True
+        self.start = 0
+
+    def more(self):
+        """Reads the next chunk. Returns False at the end of the document."""
+        if self.eof:
+            return False
+        chunk = self.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        if self.start > CHUNK_SIZE:
+            self.buffer = self.buffer[self.start:]
+            self.start = 0
+        self.buffer += chunk
+        return True
+
+    def peek(self):
+        """Next character that is not white space, without consuming it; '' at the end of the document."""
+        while True:
+            self.start = __whitespace__.match(self.buffer, self.start).end()
+            if self.start < len(self.buffer) or not self.more():
+                return self.buffer[self.start:self.start + 1]
+
+    def expect(self, characters):
+        c = self.peek()
+        if c == '' or c not in characters:
+            raise ValueError("Expected one of {0!r} at offset {1} of the json, found {2!r}".format(characters, self.start, c))
+        self.start += 1
+        return c
+
+    def value(self):
+        """Decodes and consumes the next json value, reading more of the document until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = __decoder__.raw_decode(self.buffer, self.start)
+            except ValueError:
+                if self.more():
+                    continue
+                raise
+            ## a number that ends the buffer may be cut short, like 12 of 1234 or 3 of 3.5
+            if isinstance(value, (int, long, float)) and __number_tail__.match(self.buffer, end) and self.more():
+                continue
+            self.start = end
+            return value
+
+def iter_array(source, key):
+    """Yields the items of the array under `key` of the json object in source (a string or a file like object) one by
+    one, as they are decoded, without building the rest of the document. Other keys are skipped; a missing key or a
+    null yields nothing. Items are decoded the way json.loads would decode them."""
+    reader = __reader__(source)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+
+    while True:
+        name = reader.value()
+        reader.expect(':')
+        if name == key and reader.peek() == '[':
+            reader.expect('[')
+            if reader.peek() == ']':
+                return
+            while True:
+                yield reader.value()
+                if reader.expect(',]') == ']':
+                    return
+        reader.value()
+        if reader.expect(',}') == '}':
+            return
@@ -0,0 +1,96 @@
+import time
+import random
+import threading
+from email.utils import parsedate_tz, mktime_tz
+
+## Number of requests that may be in flight to one jenkins host when it is first contacted.
+LIMIT_INITIAL = 8
+## Bounds of the number of requests in flight to one host.
+LIMIT_MIN = 1
+LIMIT_MAX = 32
+## Factor by which the limit is cut when the host shows it is overloaded.
+DECREASE_FACTOR = 0.5
+## A response is slow, and a sign of overload, when it took this many times the usual latency of its endpoint and at
+## least SLOW_RESPONSE_MIN seconds, so that a jitter on a fast endpoint is not taken for overload.
+SLOW_RESPONSE_FACTOR = 3.0
+SLOW_RESPONSE_MIN = 0.5
+## Weight of a new latency in the running average of the latency of an endpoint.
+LATENCY_SMOOTHING = 0.1
+
+## Statuses with which jenkins, or a proxy in front of it, says it is overloaded.
+OVERLOAD_STATUSES = (429, 502, 503, 504)
+## Retries of a request that failed with one of OVERLOAD_STATUSES or a connection error, see session.request.
+MAX_RETRIES = 4
+## Backoff between retries: a random time up to BACKOFF_BASE * 2**attempt seconds, capped at BACKOFF_MAX.
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+## Longest Retry-After that is honoured, in seconds.
+RETRY_AFTER_MAX = 300.0
+
+def retry_after(resp):
+    """Seconds to wait asked for by the Retry-After header of resp (delta seconds or an http date), or None."""
+    value = resp.get('retry-after') if resp is not None else None
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        date = parsedate_tz(value)
+        if date is None:
+            return None
+        seconds = mktime_tz(date) - time.time()
+    return min(RETRY_AFTER_MAX, max(0.0, seconds))
+
+def backoff(attempt):
+    """Seconds to sleep before retry number attempt (0 for the first retry), with full jitter so that the threads
+    that failed together do not come back together."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+class adaptive_limiter(object):
+    """Limits the requests in flight to one jenkins host, adapting the limit to how the host copes (AIMD).
+
+    Every response that is neither slow nor an overload status raises the limit by 1/limit, so about one more
+    request per round trip's worth of responses. An overload status, a connection error or a slow response cuts the
+    limit by DECREASE_FACTOR, at most once per round trip so that the answers to a burst of requests sent together
+    count as one signal. A Retry-After holds back every request to the host until it has passed."""
+
+    def __init__(self, initial=LIMIT_INITIAL, minimum=LIMIT_MIN, maximum=LIMIT_MAX):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.inflight = 0
+        self.blocked_until = 0.0
+        self.latencies = dict()
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while True:
+                wait = self.blocked_until - time.time()
+                if wait <= 0 and self.inflight < int(self.limit):
+                    break
+                ## wake up now and then so that Ctrl-C still reaches the main thread
+                self.condition.wait(min(0.5, wait) if wait > 0 else 0.5)
+            self.inflight += 1
+
+    def release(self, endpoint, seconds, overloaded=False, retry_after=None):
+        """Gives back the slot of a request to endpoint that took seconds and adjusts the limit by its outcome."""
+        with self.condition:
+            self.inflight -= 1
+            now = time.time()
+            if retry_after is not None:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+            usual = self.latencies.get(endpoint)
+            slow = usual is not None and seconds > SLOW_RESPONSE_FACTOR * usual and seconds > SLOW_RESPONSE_MIN
+            if not overloaded:
+                self.latencies[endpoint] = seconds if usual is None else usual + LATENCY_SMOOTHING * (seconds - usual)
+
+            if overloaded or slow:
+                if now - self.last_decrease > seconds:
+                    self.limit = max(self.minimum, self.limit * DECREASE_FACTOR)
+                    self.last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self.condition.notify_all()
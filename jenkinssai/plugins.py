@@ -1,7 +1,7 @@
 from exceptions_jenkins import JenkinsException, __check_http_response_error__
 import httplib2
-from json import loads
-from jenkinsHttpObject import __get_jenkins_http_object__
+from jsonstream import iter_array
+from jenkinsHttpObject import __get_jenkins_session__
 
 class plugins(object):
     def __init__(self, url, username=None, password=None):
@@ -9,19 +9,27 @@ class plugins(object):
         self.username = username
         self.password = password
 
-        self.http_, self.base_headers = __get_jenkins_http_object__(self.url, self.username, self.password)
+        self.session_ = __get_jenkins_session__(self.url, self.username, self.password)
+        self.base_headers = self.session_.headers
 
-    def list_installed(self):
+    @property
+    def http_(self):
+        return self.session_.http
 
-        try:
-            params = httplib2.urllib.urlencode({"depth": 1, "xpath": "/*/*/shortName|/*/*/version", "wrapper": "plugins"})
-            url_ = "{0}/pluginManager/api/json?{1}".format(self.url, params)
-            resp, content = self.http_.request(url_, method="GET", headers=self.base_headers)
-        except httplib2.HttpLib2Error as e:
-            raise JenkinsException(e.message)
+    def iter_installed(self):
+        """Yields (short name, version) of every installed plugin as it is decoded from the response.
+        Only those two fields are requested (tree=plugins[shortName,version])."""
+
+        params = httplib2.urllib.urlencode({"tree": "plugins[shortName,version]"})
+        url_ = "{0}/pluginManager/api/json?{1}".format(self.url, params)
+        resp, content = self.session_.request(url_, method="GET", headers=self.base_headers, cacheable=True)
 
         __check_http_response_error__("GET: "+url_, resp, content)
         try:
-            return {item['shortName'].encode('ascii'): item['version'].encode('ascii') for item in loads(content)['plugins']}
+            for item in iter_array(content, 'plugins'):
+                yield item['shortName'].encode('ascii'), item['version'].encode('ascii')
         except Exception as e:
-            raise JenkinsException(e.message)
\ No newline at end of file
+            raise JenkinsException(e.message)
+
+    def list_installed(self):
+        return dict(self.iter_installed())
@@ -0,0 +1,98 @@
+import os
+import time
+import hashlib
+import threading
+from json import loads, dumps
+from exceptions_jenkins import JenkinsException
+from bulk import run_bulk
+
+class snapshot_store(object):
+    """Content addressed store of job config.xml files.
+
+    Every config is stored once under objects/<sha1[:2]>/<sha1[2:]>, however many jobs or backups share it, and every
+    backup run writes a manifest under manifests/<run id>.json mapping each job to the sha1 of its config. A nightly
+    backup of mostly unchanged jobs therefore only costs the fetches and one small manifest."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+
+        for d in ('objects', 'manifests'):
+            if not os.path.isdir(os.path.join(self.directory, d)):
+                os.makedirs(os.path.join(self.directory, d))
+
+    def __object_path__(self, sha1):
+        return os.path.join(self.directory, 'objects', sha1[:2], sha1[2:])
+
+    def __manifest_path__(self, run_id):
+        return os.path.join(self.directory, 'manifests', run_id+".json")
+
+    def put(self, content):
+        """Stores content unless it is already there. Returns (sha1, True if it was new)."""
+        sha1 = hashlib.sha1(content).hexdigest()
+        path = self.__object_path__(sha1)
+        if os.path.exists(path):
+            return sha1, False
+
+        with self.lock:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            tmp = "{0}.{1}.tmp".format(path, threading.current_thread().ident)
+            with open(tmp, 'wb') as f:
+                f.write(content)
+            os.rename(tmp, path)
+        return sha1, True
+
+    def get(self, sha1):
+        try:
+            with open(self.__object_path__(sha1), 'rb') as f:
+                return f.read()
+        except IOError:
+            raise JenkinsException("No config with hash {0} in {1}".format(sha1, self.directory))
+
+    def manifest(self, run_id):
+        try:
+            with open(self.__manifest_path__(run_id), 'rb') as f:
+                return loads(f.read())
+        except IOError:
+            raise JenkinsException("No snapshot {0} in {1}".format(run_id, self.directory))
+
+    def snapshots(self):
+        """Manifests of all backup runs, oldest first."""
+        runs = [f[:-len(".json")] for f in os.listdir(os.path.join(self.directory, 'manifests')) if f.endswith(".json")]
+        return sorted([self.manifest(run_id) for run_id in runs], key=lambda m: m['created'])
+
+    def backup(self, j, jobs, concurrency=8, on_result=None):
+        """Fetches config.xml of every job in jobs from the jenkins j in parallel and stores it.
+        on_result(job, success, result) is called per job in order, result being (sha1, new) or the exception.
+        Returns the manifest of the run; jobs that failed are left out of it."""
+        run_id = time.strftime("%Y%m%dT%H%M%S") + "-%06d" % (time.time() % 1 * 1000000)
+
+        results = run_bulk(lambda job: self.put(j.get_job_config_xml(job, output='bytes')), jobs, concurrency, on_result)
+
+        manifest = {'id': run_id,
+                    'url': j.url,
+                    'created': time.time(),
+                    'jobs': dict((job, result[0]) for job, success, result in results if success)}
+
+        tmp = self.__manifest_path__(run_id)+".tmp"
+        with open(tmp, 'wb') as f:
+            f.write(dumps(manifest, indent=1, sort_keys=True))
+        os.rename(tmp, self.__manifest_path__(run_id))
+        return manifest
+
+    def restore(self, j, run_id, jobs=None, update=False, concurrency=8, on_result=None):
+        """Creates the jobs of snapshot run_id on the jenkins j from their stored configs, or replaces the configs of
+        existing jobs if update is set. jobs limits the restore to those job names. Returns the results of run_bulk."""
+        snapshot = self.manifest(run_id)['jobs']
+        if jobs is None or len(jobs) == 0:
+            jobs = sorted(snapshot.keys())
+
+        def restorer(job):
+            if not snapshot.has_key(job):
+                raise JenkinsException("Job {0} is not in snapshot {1}".format(job, run_id))
+            if update:
+                return j.update_job(job, configxml=self.get(snapshot[job]))
+            return j.create_job(job, configxml=self.get(snapshot[job]))
+
+        return run_bulk(restorer, jobs, concurrency, on_result)
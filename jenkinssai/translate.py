@@ -0,0 +1,31 @@
+import re
+
+class translator(object):
+    """A set of (src, dest) string translations compiled once and applied to a text in a single pass.
+
+    At every position the leftmost, and then the longest, matching src is replaced by its dest and scanning carries on
+    after the match, so the output of one translation is never translated again. If the same src is given twice, the
+    first pair wins."""
+
+    def __init__(self, pairs):
+        self.mapping = dict()
+        for src, dest in pairs:
+            if src and not self.mapping.has_key(src):
+                self.mapping[src] = dest
+
+        ## regex alternation takes the first alternative that matches, so longer sources must come first
+        sources = sorted(self.mapping.keys(), key=len, reverse=True)
+        self.pattern = re.compile('|'.join(re.escape(src) for src in sources)) if sources else None
+
+    def translate(self, content):
+        """Returns (translated content, {src: number of replacements}) for content."""
+        counts = dict()
+        if self.pattern is None:
+            return content, counts
+
+        def replace(match):
+            src = match.group(0)
+            counts[src] = counts.get(src, 0) + 1
+            return self.mapping[src]
+
+        return self.pattern.sub(replace, content), counts